@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import math
+import time
+import random
+import asyncio
+import argparse
+
+import httpx
+
+from standins import Behaviour, ChainFixtures, GeminiStandIn, HttpServer, Stats, fullnode_app
+
+# Offline load test: runs the backend against local fullnode/Gemini stand-ins and
+# reports latency percentiles and throughput.
+#
+#   python bench.py --concurrency 32 --requests 500 --llm-latency-ms 800
+#   python bench.py --fail-p95-ms 1500   # non-zero exit when p95 regresses
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Offline load test for the Sentinel AI backend")
+    p.add_argument("--concurrency", type=int, default=16, help="requests kept in flight")
+    p.add_argument("--requests", type=int, default=200, help="total requests to send")
+    p.add_argument("--simulate-ratio", type=float, default=0.2, help="share of /api/simulate calls")
+    p.add_argument("--tx-ratio", type=float, default=0.3, help="share of audits that target a transaction")
+    p.add_argument("--unique-targets", type=int, default=50, help="distinct targets drawn from (lower = more cache hits)")
+    p.add_argument("--stream", action="store_true", help="use the SSE variants of the endpoints")
+    p.add_argument("--node-latency-ms", type=float, default=40.0)
+    p.add_argument("--node-jitter-ms", type=float, default=20.0)
+    p.add_argument("--node-error-rate", type=float, default=0.0)
+    p.add_argument("--framework-modules", type=int, default=80, help="modules published at 0x1")
+    p.add_argument("--llm-latency-ms", type=float, default=800.0)
+    p.add_argument("--llm-jitter-ms", type=float, default=400.0)
+    p.add_argument("--llm-error-rate", type=float, default=0.0)
+    p.add_argument("--llm-429-rate", type=float, default=0.0)
+    p.add_argument("--keys", type=int, default=2, help="number of stand-in Gemini API keys")
+    p.add_argument("--key-rpm", type=float, default=None, help="override GEMINI_KEY_RPM for the run")
+    p.add_argument("--key-cooldown-s", type=float, default=None, help="override GEMINI_KEY_COOLDOWN_SECONDS")
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--json", action="store_true", help="print the report as JSON")
+    p.add_argument("--fail-p95-ms", type=float, default=None, help="exit 1 if overall p95 exceeds this")
+    return p.parse_args(argv)
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile: the smallest value with at least pct% of the samples at or below it."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def latency_summary(samples):
+    ms = [s * 1000 for s in samples]
+    return {
+        "count": len(ms),
+        "p50_ms": round(percentile(ms, 50), 2),
+        "p95_ms": round(percentile(ms, 95), 2),
+        "p99_ms": round(percentile(ms, 99), 2),
+        "max_ms": round(max(ms), 2) if ms else 0.0,
+    }
+
+
+def parse_server_timing(header):
+    """{"fetch": 0.012, "llm": 0.8, ...} in seconds from a Server-Timing header."""
+    stages = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if name and key == "dur":
+                stages[name] = float(value) / 1000
+    return stages
+
+
+def make_workload(args, fixtures):
+    """A deterministic list of (endpoint, path, body) requests."""
+    rng = random.Random(args.seed)
+    accounts = ["0x1"] + fixtures.addresses
+    audit_targets = []
+    for i in range(args.unique_targets):
+        if rng.random() < args.tx_ratio:
+            audit_targets.append(fixtures.hashes[i % len(fixtures.hashes)])
+        else:
+            audit_targets.append(accounts[i % len(accounts)])
+
+    suffix = "?stream=true" if args.stream else ""
+    workload = []
+    for _ in range(args.requests):
+        if rng.random() < args.simulate_ratio:
+            address = rng.choice(accounts)
+            module = fixtures.modules[address][0]["abi"]["name"]
+            body = {"sender": address, "function_id": f"{address}::{module}::withdraw_0",
+                    "type_args": ["0x1::aptos_coin::AptosCoin"], "args": ["100"]}
+            workload.append(("simulate", "/api/simulate" + suffix, body))
+        else:
+            target = rng.choice(audit_targets)
+            kind = "transaction" if target in fixtures.transactions else "address"
+            workload.append(("audit", "/api/audit" + suffix, {"target": target, "type": kind}))
+    return workload
+
+
+async def drive(base_url, workload, concurrency):
+    samples = {}
+    errors = {}
+    stage_samples = {}
+    queue = asyncio.Queue()
+    for item in workload:
+        queue.put_nowait(item)
+
+    async def worker(http):
+        while True:
+            try:
+                endpoint, path, body = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                response = await http.post(path, json=body)
+                ok = response.status_code == 200 and "event: error" not in response.text
+                for stage, seconds in parse_server_timing(response.headers.get("server-timing", "")).items():
+                    stage_samples.setdefault(endpoint, {}).setdefault(stage, []).append(seconds)
+            except httpx.HTTPError:
+                ok = False
+            elapsed = time.perf_counter() - start
+            samples.setdefault(endpoint, []).append(elapsed)
+            if not ok:
+                errors[endpoint] = errors.get(endpoint, 0) + 1
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as http:
+        start = time.perf_counter()
+        await asyncio.gather(*[worker(http) for _ in range(concurrency)])
+        wall = time.perf_counter() - start
+    return samples, errors, wall, stage_samples
+
+
+async def run(args):
+    fixtures = ChainFixtures(framework_modules=args.framework_modules, seed=args.seed)
+    node_stats, llm_stats = Stats(), Stats()
+    node = HttpServer(fullnode_app(
+        fixtures, Behaviour(args.node_latency_ms, args.node_jitter_ms, args.node_error_rate, seed=args.seed), node_stats
+    ))
+    gemini = GeminiStandIn(
+        Behaviour(args.llm_latency_ms, args.llm_jitter_ms, args.llm_error_rate, args.llm_429_rate, seed=args.seed + 1),
+        llm_stats,
+    )
+    node_url = await node.start()
+    gemini_endpoint = await gemini.start()
+
+    # The backend reads its configuration at import time, so point it at the stand-ins first.
+    for name in [n for n in os.environ if n.startswith("GEMINI_API_KEY")]:
+        del os.environ[name]
+    for i in range(args.keys):
+        os.environ[f"GEMINI_API_KEY_BENCH_{i}"] = f"bench-key-{i}"
+    os.environ["GEMINI_API_ENDPOINT"] = gemini_endpoint
+    os.environ["APTOS_NODE_URL"] = f"{node_url}/v1"
+    os.environ["AUDIT_CACHE_PATH"] = ""
+    os.environ["AUDIT_HISTORY_PATH"] = ""
+    if args.key_rpm is not None:
+        os.environ["GEMINI_KEY_RPM"] = str(args.key_rpm)
+    if args.key_cooldown_s is not None:
+        os.environ["GEMINI_KEY_COOLDOWN_SECONDS"] = str(args.key_cooldown_s)
+    import main
+
+    backend = HttpServer(main.app)
+    backend_url = await backend.start()
+    try:
+        samples, errors, wall, stage_samples = await drive(backend_url, make_workload(args, fixtures), args.concurrency)
+    finally:
+        await backend.stop()
+        await gemini.stop()
+        await node.stop()
+
+    everything = [s for endpoint_samples in samples.values() for s in endpoint_samples]
+    report = {
+        "config": vars(args),
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(everything) / wall, 2) if wall else 0.0,
+        "overall": latency_summary(everything),
+        "endpoints": {endpoint: dict(latency_summary(s), errors=errors.get(endpoint, 0)) for endpoint, s in samples.items()},
+        # What the backend itself reports per stage (Server-Timing); empty with --stream.
+        "server_timing": {
+            endpoint: {stage: latency_summary(s) for stage, s in stages.items()}
+            for endpoint, stages in stage_samples.items()
+        },
+        "stages": {
+            "fullnode": node_stats.summary(),
+            "llm": dict(llm_stats.summary(), calls_per_request=round(llm_stats.requests / max(len(everything), 1), 3),
+                        keys=dict(gemini.keys_seen)),
+        },
+    }
+    return report
+
+
+def print_report(report):
+    print(f"{report['overall']['count']} requests in {report['wall_seconds']}s "
+          f"-> {report['requests_per_second']} req/s")
+    print(f"{'endpoint':<10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'errors':>7}")
+    rows = dict(report["endpoints"], overall=dict(report["overall"], errors=sum(
+        e["errors"] for e in report["endpoints"].values())))
+    for name, row in rows.items():
+        print(f"{name:<10} {row['count']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} {row['p99_ms']:>9} "
+              f"{row['max_ms']:>9} {row['errors']:>7}")
+    for endpoint, stages in report["server_timing"].items():
+        for stage, row in stages.items():
+            print(f"{endpoint + '.' + stage:<18} {row['count']:>6} {row['p50_ms']:>9} {row['p95_ms']:>9} "
+                  f"{row['p99_ms']:>9} {row['max_ms']:>9}")
+    for stage, stats in report["stages"].items():
+        print(f"[{stage}] {json.dumps(stats)}")
+
+
+def main_cli(argv=None):
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    if args.fail_p95_ms is not None and report["overall"]["p95_ms"] > args.fail_p95_ms:
+        print(f"FAILED: p95 {report['overall']['p95_ms']}ms > {args.fail_p95_ms}ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_cli())
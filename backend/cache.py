@@ -0,0 +1,182 @@
+import os
+import copy
+import json
+import asyncio
+import time
+import sqlite3
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# In-memory LRU size and entry lifetime for cached audit verdicts.
+AUDIT_CACHE_SIZE = int(os.getenv("AUDIT_CACHE_SIZE", "1024"))
+AUDIT_CACHE_TTL_SECONDS = float(os.getenv("AUDIT_CACHE_TTL_SECONDS", "86400"))
+# Optional SQLite file so verdicts survive restarts. Empty disables the disk backend.
+AUDIT_CACHE_PATH = os.getenv("AUDIT_CACHE_PATH", "")
+
+
+def connect_sqlite(path):
+    """SQLite connection that several worker processes can share (WAL, waits on locks)."""
+    conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+def fingerprint(*parts):
+    """Stable sha256 over JSON-serializable parts (module bytecode, ABIs, tx payloads...)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(json.dumps(part, sort_keys=True, default=str).encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class DiskStore:
+    """Tiny SQLite key/value table backing the in-memory cache.
+
+    Other workers may hold the file's write lock for up to the connection timeout,
+    so queries run on a dedicated thread instead of the event loop.
+    """
+
+    def __init__(self, path):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-cache")
+        self.conn = connect_sqlite(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS audit_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+        self.conn.commit()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def get(self, key):
+        return await self._run(self._get, key)
+
+    async def set(self, key, value, expires):
+        await self._run(self._set, key, json.dumps(value), expires)
+
+    async def delete(self, key):
+        await self._run(self._delete, key)
+
+    def _get(self, key):
+        row = self.conn.execute(
+            "SELECT value, expires FROM audit_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if not row:
+            return None, 0
+        return json.loads(row[0]), row[1]
+
+    def _set(self, key, value, expires):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO audit_cache (key, value, expires) VALUES (?, ?, ?)",
+            (key, value, expires),
+        )
+        self.conn.commit()
+
+    def _delete(self, key):
+        self.conn.execute("DELETE FROM audit_cache WHERE key = ?", (key,))
+        self.conn.commit()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.conn.close()
+
+
+class AuditCache:
+    """LRU + TTL cache for audit verdicts, keyed on content fingerprints.
+
+    Because keys are derived from the fetched code (and the prompt version), a
+    module upgrade or prompt change simply produces a new key; stale entries age
+    out through LRU/TTL eviction instead of explicit invalidation.
+    """
+
+    def __init__(self, max_size=AUDIT_CACHE_SIZE, ttl=AUDIT_CACHE_TTL_SECONDS, path=AUDIT_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.disk = DiskStore(path) if path else None
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key):
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            value, expires = entry
+            if expires > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+
+        if self.disk:
+            value, expires = await self.disk.get(key)
+            if value is not None and expires > now:
+                self._remember(key, value, expires)
+                self.hits += 1
+                return value
+            if value is not None:
+                await self.disk.delete(key)
+
+        self.misses += 1
+        return None
+
+    async def set(self, key, value):
+        expires = time.time() + self.ttl
+        self._remember(key, value, expires)
+        if self.disk:
+            await self.disk.set(key, value, expires)
+
+    def _remember(self, key, value, expires):
+        self.entries[key] = (value, expires)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def close(self):
+        if self.disk:
+            self.disk.close()
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Joins identical concurrent computations into one.
+
+    Every caller of do() with the same key while a computation is running awaits
+    that same task and gets its own copy of the result (or the same exception).
+    A caller that is cancelled just stops waiting; the shared task is only
+    cancelled once no one is waiting for it any more. The task runs in `context`
+    when given, so it does not inherit per-caller state from whoever came first.
+    """
+
+    def __init__(self):
+        self.flights = {}
+
+    async def do(self, key, factory, context=None):
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = _Flight(asyncio.get_running_loop().create_task(factory(), context=context))
+            self.flights[key] = flight
+            flight.task.add_done_callback(lambda _: self._finish(key, flight))
+        flight.waiters += 1
+        try:
+            result = await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+        return copy.deepcopy(result)
+
+    def _finish(self, key, flight):
+        if self.flights.get(key) is flight:
+            del self.flights[key]
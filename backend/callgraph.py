@@ -0,0 +1,383 @@
+import os
+import hashlib
+from collections import OrderedDict, deque
+
+from chain import normalize_address
+
+# Reads Move module bytecode (binary format versions 5-7) far enough to see which
+# function calls which, so an audit can say what an entry function really reaches
+# instead of guessing from the ABI. Only the tables needed for that are decoded.
+
+MAGIC = b"\xa1\x1c\xeb\x0b"
+MIN_VERSION, MAX_VERSION = 5, 7
+# Parsed modules kept in memory, keyed by bytecode hash.
+CALLGRAPH_CACHE_ENTRIES = int(os.getenv("CALLGRAPH_CACHE_ENTRIES", "4096"))
+
+# Table kinds in the module header.
+MODULE_HANDLES, FUNCTION_HANDLES, FUNCTION_INST = 0x1, 0x3, 0x4
+SIGNATURES, IDENTIFIERS, ADDRESS_IDENTIFIERS, FUNCTION_DEFS = 0x5, 0x7, 0x8, 0xC
+
+VISIBILITY = {0: "private", 1: "public", 2: "public", 3: "friend"}  # 2: pre-v5 `public(script)`
+NATIVE, ENTRY = 0x2, 0x4
+
+# Signature tokens.
+REFERENCE, MUTABLE_REFERENCE, STRUCT, TYPE_PARAMETER, VECTOR, STRUCT_INST, SIGNER = 0x6, 0x7, 0x8, 0x9, 0xA, 0xB, 0xC
+PRIMITIVE_TOKENS = {0x1, 0x2, 0x3, 0x4, 0x5, 0xD, 0xE, 0xF}
+
+# Operand layout per opcode: "" none, "u" one uleb128 index, "b" one byte,
+# digits a fixed-width constant, "u8" an index then a u64, "c"/"g" Call/CallGeneric.
+_OPERANDS = {
+    0x01: "", 0x02: "", 0x03: "u", 0x04: "u", 0x05: "u", 0x06: "8", 0x07: "u", 0x08: "", 0x09: "",
+    0x0A: "b", 0x0B: "b", 0x0C: "b", 0x0D: "b", 0x0E: "b", 0x0F: "u", 0x10: "u", 0x11: "c", 0x12: "u", 0x13: "u",
+    0x27: "", 0x28: "", 0x29: "u", 0x2A: "u", 0x2B: "u", 0x2C: "u", 0x2D: "u", 0x2E: "", 0x2F: "", 0x30: "",
+    0x31: "1", 0x32: "16", 0x33: "", 0x34: "", 0x35: "", 0x36: "u", 0x37: "u", 0x38: "g", 0x39: "u", 0x3A: "u",
+    0x3B: "u", 0x3C: "u", 0x3D: "u", 0x3E: "u", 0x3F: "u", 0x40: "u8", 0x41: "u", 0x42: "u", 0x43: "u", 0x44: "u",
+    0x45: "u", 0x46: "u8", 0x47: "u", 0x48: "2", 0x49: "4", 0x4A: "32", 0x4B: "", 0x4C: "", 0x4D: "",
+    # Version 7 enum instructions.
+    0x4E: "u", 0x4F: "u", 0x50: "u", 0x51: "u", 0x52: "u", 0x53: "u", 0x54: "u", 0x55: "u", 0x56: "u", 0x57: "u",
+}
+_OPERANDS.update({op: "" for op in range(0x14, 0x27)})  # ReadRef .. Ge: stack-only
+_NONE, _ULEB, _BYTE, _CALL, _CALL_GENERIC, _ULEB_U64 = 0, 1, 2, 3, 4, 5
+_LAYOUT = [None] * 256
+_WIDTH = [0] * 256
+for _op, _kind in _OPERANDS.items():
+    if _kind.isdigit():
+        _LAYOUT[_op], _WIDTH[_op] = _NONE, int(_kind)
+    else:
+        _LAYOUT[_op] = {"": _NONE, "u": _ULEB, "b": _BYTE, "c": _CALL, "g": _CALL_GENERIC, "u8": _ULEB_U64}[_kind]
+
+# Calls that hand out value, authority or code, and the calls that look at who signed.
+SENSITIVE_CALLS = frozenset({
+    "0x1::coin::withdraw",
+    "0x1::coin::extract",
+    "0x1::coin::extract_all",
+    "0x1::coin::mint",
+    "0x1::fungible_asset::withdraw",
+    "0x1::fungible_asset::withdraw_with_ref",
+    "0x1::fungible_asset::extract",
+    "0x1::fungible_asset::mint",
+    "0x1::primary_fungible_store::withdraw",
+    "0x1::primary_fungible_store::mint",
+    "0x1::dispatchable_fungible_asset::withdraw",
+    "0x1::account::create_signer_with_capability",
+    "0x1::object::generate_signer_for_extending",
+    "0x1::code::publish_package_txn",
+})
+SIGNER_CHECKS = frozenset({"0x1::signer::address_of", "0x1::signer::borrow_address"})
+
+
+class BytecodeError(ValueError):
+    """The bytes are not a Move module this parser understands"""
+
+
+def _uleb(data, pos):
+    value = shift = 0
+    while True:
+        if pos >= len(data):
+            raise BytecodeError("truncated uleb128")
+        byte = data[pos]
+        pos += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, pos
+        shift += 7
+        if shift > 63:
+            raise BytecodeError("uleb128 too long")
+
+
+def _skip_type(data, pos):
+    """Skips one signature token; returns (pos, whether it is signer or &signer)."""
+    token = data[pos]
+    pos += 1
+    if token in PRIMITIVE_TOKENS:
+        return pos, False
+    if token == SIGNER:
+        return pos, True
+    if token in (REFERENCE, MUTABLE_REFERENCE):
+        return _skip_type(data, pos)
+    if token == VECTOR:
+        return _skip_type(data, pos)[0], False
+    if token in (STRUCT, TYPE_PARAMETER):
+        return _uleb(data, pos)[1], False
+    if token == STRUCT_INST:
+        _, pos = _uleb(data, pos)
+        count, pos = _uleb(data, pos)
+        for _ in range(count):
+            pos = _skip_type(data, pos)[0]
+        return pos, False
+    raise BytecodeError(f"unknown signature token {token:#x}")
+
+
+def _read_tables(data):
+    if data[:4] != MAGIC:
+        raise BytecodeError("not Move bytecode (bad magic)")
+    version = int.from_bytes(data[4:8], "little") & 0xFFFF
+    if not MIN_VERSION <= version <= MAX_VERSION:
+        raise BytecodeError(f"unsupported bytecode version {version}")
+    count, pos = _uleb(data, 8)
+    headers = []
+    for _ in range(count):
+        kind = data[pos]
+        offset, pos = _uleb(data, pos + 1)
+        length, pos = _uleb(data, pos)
+        headers.append((kind, offset, length))
+    start = pos
+    tables = {kind: (start + offset, start + offset + length) for kind, offset, length in headers}
+    end = start + max((offset + length for _, offset, length in headers), default=0)
+    if end > len(data):
+        raise BytecodeError("table extends past the end of the module")
+    return version, tables, end
+
+
+def _entries(data, tables, kind, read):
+    begin, end = tables.get(kind, (0, 0))
+    items, pos = [], begin
+    while pos < end:
+        item, pos = read(data, pos)
+        items.append(item)
+    return items
+
+
+def _identifier(data, pos):
+    length, pos = _uleb(data, pos)
+    return data[pos:pos + length].decode(), pos + length
+
+
+def _address(data, pos):
+    return normalize_address(data[pos:pos + 32].hex()), pos + 32
+
+
+def _uleb_pair(data, pos):
+    first, pos = _uleb(data, pos)
+    second, pos = _uleb(data, pos)
+    return (first, second), pos
+
+
+def _signature(data, pos):
+    """Whether each type in the signature is signer / &signer."""
+    count, pos = _uleb(data, pos)
+    signers = []
+    for _ in range(count):
+        pos, is_signer = _skip_type(data, pos)
+        signers.append(is_signer)
+    return signers, pos
+
+
+def _function_handle_reader(version):
+    def read(data, pos):
+        module, pos = _uleb(data, pos)
+        name, pos = _uleb(data, pos)
+        params, pos = _uleb(data, pos)
+        _, pos = _uleb(data, pos)  # return signature
+        type_params, pos = _uleb(data, pos)
+        pos += type_params  # one ability-set byte each
+        if version >= 7:
+            if data[pos] != 0:
+                raise BytecodeError("access specifiers are not supported")
+            pos += 1
+        return (module, name, params), pos
+    return read
+
+
+def _read_code(data, pos, instantiations):
+    """Skips one function body; returns (end position, function-handle indices it calls in order)."""
+    count, pos = _uleb(data, pos)
+    calls = []
+    layout, width = _LAYOUT, _WIDTH
+    for _ in range(count):
+        op = data[pos]
+        pos += 1
+        kind = layout[op]
+        if kind is None:
+            raise BytecodeError(f"unknown opcode {op:#x}")
+        if kind == _NONE:
+            pos += width[op]
+        elif kind == _BYTE:
+            pos += 1
+        elif data[pos] < 0x80 and kind != _ULEB_U64:
+            # One-byte index, the common case.
+            if kind == _CALL:
+                calls.append(data[pos])
+            elif kind == _CALL_GENERIC:
+                calls.append(instantiations[data[pos]])
+            pos += 1
+        else:
+            index, pos = _uleb(data, pos)
+            if kind == _CALL:
+                calls.append(index)
+            elif kind == _CALL_GENERIC:
+                calls.append(instantiations[index])
+            elif kind == _ULEB_U64:
+                pos += 8
+    return pos, calls
+
+
+def parse_module(data):
+    """Decodes module bytecode into {"address", "name", "functions": {name: summary}}.
+
+    Each function summary has its visibility, entry and native flags, whether it
+    takes a signer, and the functions it calls as "address::module::function".
+    """
+    try:
+        return _parse_module(bytes(data))
+    except (IndexError, UnicodeDecodeError) as e:
+        raise BytecodeError(f"malformed module: {e}")
+
+
+def _parse_module(data):
+    version, tables, end = _read_tables(data)
+    identifiers = _entries(data, tables, IDENTIFIERS, _identifier)
+    addresses = _entries(data, tables, ADDRESS_IDENTIFIERS, _address)
+    modules = [
+        f"{addresses[address]}::{identifiers[name]}"
+        for address, name in _entries(data, tables, MODULE_HANDLES, _uleb_pair)
+    ]
+    signatures = _entries(data, tables, SIGNATURES, _signature)
+    handles = _entries(data, tables, FUNCTION_HANDLES, _function_handle_reader(version))
+    instantiations = [handle for handle, _ in _entries(data, tables, FUNCTION_INST, _uleb_pair)]
+    names = [f"{modules[module]}::{identifiers[name]}" for module, name, _ in handles]
+    self_index, _ = _uleb(data, end)
+
+    functions = {}
+    begin, table_end = tables.get(FUNCTION_DEFS, (0, 0))
+    pos = begin
+    while pos < table_end:
+        handle, pos = _uleb(data, pos)
+        visibility, flags = data[pos], data[pos + 1]
+        pos += 2
+        acquires, pos = _uleb(data, pos)
+        for _ in range(acquires):
+            pos = _uleb(data, pos)[1]
+        calls = []
+        if not flags & NATIVE:
+            _, pos = _uleb(data, pos)  # locals signature
+            pos, calls = _read_code(data, pos, instantiations)
+        _, name, params = handles[handle]
+        functions[identifiers[name]] = {
+            "visibility": VISIBILITY.get(visibility, "private"),
+            "is_entry": bool(flags & ENTRY) or visibility == 2,
+            "is_native": bool(flags & NATIVE),
+            "takes_signer": any(signatures[params]),
+            "calls": tuple(dict.fromkeys(names[index] for index in calls)),
+        }
+    address, name = modules[self_index].split("::")
+    return {"address": address, "name": name, "functions": functions}
+
+
+_summaries = OrderedDict()
+
+
+def summarize(bytecode):
+    """parse_module for hex bytecode as served by the fullnode, memoized per bytecode hash.
+
+    Returns None for modules that cannot be parsed (remembered too).
+    """
+    key = hashlib.sha256(bytecode.encode()).hexdigest()
+    if key in _summaries:
+        _summaries.move_to_end(key)
+        return _summaries[key]
+    try:
+        summary = parse_module(bytes.fromhex(bytecode[2:] if bytecode.startswith("0x") else bytecode))
+    except ValueError:  # BytecodeError, or not hex at all
+        summary = None
+    _summaries[key] = summary
+    while len(_summaries) > CALLGRAPH_CACHE_ENTRIES:
+        _summaries.popitem(last=False)
+    return summary
+
+
+class CallGraph:
+    """Functions of a set of modules and the calls between them, across modules."""
+
+    def __init__(self, summaries):
+        self.functions = {}
+        for summary in summaries:
+            for name, fn in summary["functions"].items():
+                self.functions[f"{summary['address']}::{summary['name']}::{name}"] = fn
+
+    def callees(self, function):
+        fn = self.functions.get(function)
+        return fn["calls"] if fn else ()
+
+    def checks_signer(self, function):
+        return any(callee in SIGNER_CHECKS for callee in self.callees(function))
+
+    def entry_functions(self, address=None):
+        prefix = None if address is None else normalize_address(address) + "::"
+        return [
+            name for name, fn in self.functions.items()
+            if fn["is_entry"] and (prefix is None or name.startswith(prefix))
+        ]
+
+    def paths(self, source, targets, stop_at_signer_check=False):
+        """Shortest call path from source to each reachable function in targets.
+
+        With stop_at_signer_check, functions that call signer::address_of (or
+        borrow_address) are not explored, leaving only paths nothing guards.
+        Calls into modules outside the graph end a path.
+        """
+        parents = {source: None}
+        queue = deque([source])
+        found = {}
+        while queue:
+            function = queue.popleft()
+            if stop_at_signer_check and self.checks_signer(function):
+                continue
+            for callee in self.callees(function):
+                if callee in parents:
+                    continue
+                parents[callee] = function
+                if callee in targets:
+                    found[callee] = self._path(parents, callee)
+                elif callee in self.functions:
+                    queue.append(callee)
+        return found
+
+    @staticmethod
+    def _path(parents, function):
+        path = []
+        while function is not None:
+            path.append(function)
+            function = parents[function]
+        return path[::-1]
+
+    def sensitive_reach(self, address=None, sinks=SENSITIVE_CALLS):
+        """For each entry function: the sensitive calls it reaches, and whether any path skips the signer."""
+        report = []
+        for entry in self.entry_functions(address):
+            reached = self.paths(entry, sinks)
+            if not reached:
+                continue
+            unguarded = self.paths(entry, sinks, stop_at_signer_check=True)
+            for sink, path in sorted(reached.items()):
+                report.append({
+                    "entry": entry,
+                    "sink": sink,
+                    "path": unguarded.get(sink, path),
+                    "signer_checked": sink not in unguarded,
+                })
+        return report
+
+
+def analyze_package(modules):
+    """Call-graph facts for a package as returned by account_modules (bytecode + abi)."""
+    summaries, unparsed = [], []
+    for module in modules:
+        summary = summarize(module["bytecode"]) if module.get("bytecode") else None
+        if summary is None:
+            unparsed.append((module.get("abi") or {}).get("name", "?"))
+        else:
+            summaries.append(summary)
+    graph = CallGraph(summaries)
+    return {"modules": len(summaries), "unparsed": unparsed, "reach": graph.sensitive_reach()}
+
+
+def format_reach(reach, limit=20):
+    """One line per entry function and sensitive call it reaches, for the model hint."""
+    lines = []
+    for item in reach[:limit]:
+        guard = "signer checked on the way" if item["signer_checked"] else "NO signer check on the way"
+        lines.append(f"{item['entry']} reaches {item['sink']} ({guard}): {' -> '.join(item['path'])}")
+    if len(reach) > limit:
+        lines.append(f"... {len(reach) - limit} more")
+    return "\n".join(lines)
@@ -0,0 +1,289 @@
+import os
+import json
+import time
+import asyncio
+from collections import OrderedDict
+
+import httpx
+
+from cache import fingerprint
+from metrics import CACHE_REQUESTS, TARGET_LOOKUP_FAILURES
+
+# How long fetched modules are served without checking the chain again.
+MODULE_CACHE_TTL_SECONDS = float(os.getenv("MODULE_CACHE_TTL_SECONDS", "30"))
+# Upper bound on the (approximate) JSON size of all cached modules.
+MODULE_CACHE_MAX_BYTES = int(os.getenv("MODULE_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Connection pool each worker keeps open to the fullnode (HTTP/2 where the node offers it over TLS).
+APTOS_MAX_CONNECTIONS = int(os.getenv("APTOS_MAX_CONNECTIONS", "100"))
+APTOS_KEEPALIVE_CONNECTIONS = int(os.getenv("APTOS_KEEPALIVE_CONNECTIONS", "32"))
+APTOS_KEEPALIVE_SECONDS = float(os.getenv("APTOS_KEEPALIVE_SECONDS", "30"))
+APTOS_HTTP2 = os.getenv("APTOS_HTTP2", "1") == "1"
+# Optional API key for hosted fullnodes (raises their rate limits).
+APTOS_API_KEY = os.getenv("APTOS_API_KEY", "")
+
+# The framework's package registry is large, so 0x1..0xa simply refetch on expiry.
+FRAMEWORK_ADDRESSES = {f"0x{i:x}" for i in range(1, 11)}
+PACKAGE_REGISTRY = "0x1::code::PackageRegistry"
+
+
+async def make_rest_client(node_url):
+    """RestClient with a pool sized for a busy worker instead of httpx's defaults."""
+    from aptos_sdk.async_client import ClientConfig, RestClient
+
+    client = RestClient(node_url, ClientConfig(http2=APTOS_HTTP2, api_key=APTOS_API_KEY or None))
+    pooled = httpx.AsyncClient(
+        http2=APTOS_HTTP2,
+        limits=httpx.Limits(
+            max_connections=APTOS_MAX_CONNECTIONS,
+            max_keepalive_connections=APTOS_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=APTOS_KEEPALIVE_SECONDS,
+        ),
+        timeout=httpx.Timeout(60.0, pool=None),
+        headers=client.client.headers,
+    )
+    # RestClient has no knob for its limits; swap its (still unused) httpx client for the pooled one.
+    await client.client.aclose()
+    client.client = pooled
+    return client
+
+
+def normalize_address(address):
+    """0x0001 / 0X1 / 1 -> 0x1, so equivalent spellings share cache entries."""
+    raw = address.strip().lower()
+    if raw.startswith("0x"):
+        raw = raw[2:]
+    return "0x" + (raw.lstrip("0") or "0")
+
+
+class _Entry:
+    __slots__ = ("value", "code_version", "fetched_at", "size", "fingerprint")
+
+    def __init__(self, value, code_version):
+        self.value = value
+        self.code_version = code_version
+        self.fetched_at = time.monotonic()
+        self.size = len(json.dumps(value, default=str))
+        # Serialising a large package is slow; audit cache keys reuse this on every hit.
+        self.fingerprint = fingerprint(value)
+
+
+class ModuleCache:
+    """Shared module/ABI cache in front of the fullnode RestClient.
+
+    - Fresh entries are served from memory.
+    - Stale entries are served immediately while a background task revalidates
+      them; if the address's package registry shows no new publish or upgrade,
+      the modules are kept without being downloaded again.
+    - Concurrent misses for the same key join one in-flight fetch.
+    - Total size is capped with LRU eviction.
+    """
+
+    def __init__(self, client, ttl=MODULE_CACHE_TTL_SECONDS, max_bytes=MODULE_CACHE_MAX_BYTES):
+        self.client = client
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.total_bytes = 0
+        self.pending = {}
+
+    async def get_modules(self, address):
+        """All modules published at address."""
+        address = normalize_address(address)
+        return await self._get(("modules", address), address)
+
+    async def get_module(self, address, module_name):
+        """A single module, taken from the full listing when that is already cached."""
+        address = normalize_address(address)
+        listing = self.entries.get(("modules", address))
+        if listing is not None:
+            for module in listing.value:
+                if module.get("abi", {}).get("name") == module_name:
+                    if self._is_stale(listing):
+                        self._refresh_in_background(("modules", address), address)
+                    CACHE_REQUESTS.inc(cache="module", result="hit")
+                    return module
+        return await self._get(("module", address, module_name), address)
+
+    def fingerprint(self, address, modules):
+        """The cached fingerprint of a listing get_modules returned, or None if it has since been replaced."""
+        entry = self.entries.get(("modules", normalize_address(address)))
+        if entry is not None and entry.value is modules:
+            return entry.fingerprint
+        return None
+
+    def invalidate(self, address):
+        """Forgets everything cached for address, e.g. right after new code was published there."""
+        address = normalize_address(address)
+        for key in [k for k in self.entries if k[1] == address]:
+            self.total_bytes -= self.entries.pop(key).size
+
+    async def _get(self, key, address):
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+            if self._is_stale(entry):
+                self._refresh_in_background(key, address)
+            CACHE_REQUESTS.inc(cache="module", result="hit")
+            return entry.value
+        CACHE_REQUESTS.inc(cache="module", result="miss")
+        return await self._fetch(key, address)
+
+    def _is_stale(self, entry):
+        return time.monotonic() - entry.fetched_at > self.ttl
+
+    async def _fetch(self, key, address):
+        task = self.pending.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._load(key, address))
+            self.pending[key] = task
+            task.add_done_callback(lambda t: self._settle(key, t))
+        # Shielded so one cancelled caller does not abort the fetch for everyone else.
+        return await asyncio.shield(task)
+
+    def _settle(self, key, task):
+        self.pending.pop(key, None)
+        # Every waiter may have given up (e.g. a lost lookup race); mark the error as seen.
+        if not task.cancelled():
+            task.exception()
+
+    def _refresh_in_background(self, key, address):
+        if key in self.pending:
+            return
+        task = asyncio.ensure_future(self._fetch(key, address))
+        task.add_done_callback(self._log_refresh_error)
+
+    @staticmethod
+    def _log_refresh_error(task):
+        if not task.cancelled() and task.exception():
+            print(f"Module cache refresh failed: {task.exception()}")
+
+    async def _load(self, key, address):
+        entry = self.entries.get(key)
+        if entry is not None and address not in FRAMEWORK_ADDRESSES:
+            code_version = await self._code_version(address)
+            if code_version is not None and code_version == entry.code_version:
+                # Nothing published or upgraded since the last fetch; keep the modules we have.
+                entry.fetched_at = time.monotonic()
+                return entry.value
+
+        if key[0] == "modules":
+            fetch = self.client.account_modules(address)
+        else:
+            fetch = self.client.account_module(address, key[2])
+        value, code_version = await asyncio.gather(fetch, self._code_version(address))
+        self._store(key, _Entry(value, code_version))
+        return value
+
+    async def _code_version(self, address):
+        """(package, upgrade_number) pairs from the PackageRegistry, or None to always refetch.
+
+        The account sequence number is no use here: code published through a resource
+        account's SignerCapability, an object or a multisig account changes without it.
+        """
+        if address in FRAMEWORK_ADDRESSES:
+            return None
+        try:
+            registry = await self.client.account_resource(address, PACKAGE_REGISTRY)
+        except Exception:
+            return None
+        packages = (registry.get("data") or {}).get("packages") or []
+        return tuple((p.get("name"), str(p.get("upgrade_number"))) for p in packages)
+
+    def _store(self, key, entry):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.total_bytes += entry.size
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.total_bytes -= evicted.size
+
+
+class TargetNotFound(Exception):
+    """Neither an account with modules nor a transaction matched the target"""
+
+
+class ResolvedTarget:
+    __slots__ = ("kind", "target", "data", "_fingerprint")
+
+    def __init__(self, kind, target, data, fingerprint=None):
+        self.kind = kind  # "address" or "transaction"
+        self.target = target
+        self.data = data  # module list or transaction dict
+        self._fingerprint = fingerprint
+
+    @property
+    def fingerprint(self):
+        """Content hash of data, computed on first use unless the module cache already had it."""
+        if self._fingerprint is None:
+            self._fingerprint = fingerprint(self.data)
+        return self._fingerprint
+
+
+def classify_target(target):
+    """Classifies a target by shape.
+
+    Returns "address" for short account addresses, "ambiguous" for 32-byte hex
+    strings (a tx hash and a long account address look identical) and None for
+    anything that is not hex at all.
+    """
+    raw = target.strip().lower()
+    if raw.startswith("0x"):
+        raw = raw[2:]
+    if not raw or len(raw) > 64 or any(c not in "0123456789abcdef" for c in raw):
+        return None
+    if len(raw) == 64:
+        return "ambiguous"
+    return "address"
+
+
+async def resolve_target(module_cache, client, target):
+    """Fetches what the target points at, racing both lookups when its shape is ambiguous."""
+    shape = classify_target(target)
+    if shape is None:
+        raise TargetNotFound(f"'{target}' is neither an account address nor a transaction hash")
+
+    if shape == "address":
+        modules = await module_cache.get_modules(target)
+        return ResolvedTarget("address", normalize_address(target), modules, module_cache.fingerprint(target, modules))
+
+    async def lookup(kind, fetch):
+        try:
+            return kind, await fetch
+        except Exception:
+            TARGET_LOOKUP_FAILURES.inc(lookup=kind, reason="error")
+            raise
+
+    tasks = [
+        asyncio.ensure_future(lookup("address", module_cache.get_modules(target))),
+        asyncio.ensure_future(lookup("transaction", client.transaction_by_hash(target))),
+    ]
+    fallback = None
+    errors = []
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            try:
+                kind, data = await next_done
+            except Exception as e:
+                errors.append(e)
+                continue
+            if kind == "address":
+                resolved = ResolvedTarget(kind, normalize_address(target), data, module_cache.fingerprint(target, data))
+                # An account without modules is only a fallback: the hash may still be a transaction.
+                if not data:
+                    TARGET_LOOKUP_FAILURES.inc(lookup=kind, reason="empty")
+                    fallback = resolved
+                    continue
+                return resolved
+            return ResolvedTarget(kind, target, data)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    if fallback is not None:
+        return fallback
+    raise TargetNotFound(str(errors[0]) if errors else f"Nothing found for '{target}'")
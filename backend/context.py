@@ -0,0 +1,177 @@
+import os
+import re
+
+# Rough prompt budget per model call, in tokens (~4 characters each).
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+# Packages needing more calls than this keep only their highest-ranked modules.
+CONTEXT_MAX_CHUNKS = int(os.getenv("CONTEXT_MAX_CHUNKS", "8"))
+
+CHARS_PER_TOKEN = 4
+
+SEVERITY_RANK = {"info": 1, "low": 2, "medium": 4, "high": 8}
+VALUE_MOVING_NAME = re.compile(r"withdraw|mint|burn|transfer|deposit|claim|payout|extract|drain|sweep|admin|owner|upgrade|set_", re.I)
+
+
+def estimate_tokens(text):
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+def _short_type(type_str):
+    # 0x1::string::String -> string::String; keeps the module so types stay unambiguous.
+    return re.sub(r"0x[0-9a-fA-F]+::", "", type_str)
+
+
+def _generics(params, prefix="T"):
+    if not params:
+        return ""
+    return "<" + ", ".join(f"{prefix}{i}" for i in range(len(params))) + ">"
+
+
+def format_function(fn):
+    visibility = fn.get("visibility", "private")
+    flags = [] if visibility == "private" else [visibility]
+    if fn.get("is_entry"):
+        flags.append("entry")
+    params = ", ".join(_short_type(p) for p in fn.get("params", []))
+    returns = [_short_type(r) for r in fn.get("return", [])]
+    line = f"{' '.join(flags + ['fun'])} {fn['name']}{_generics(fn.get('generic_type_params'))}({params})"
+    if returns:
+        line += ": " + (returns[0] if len(returns) == 1 else "(" + ", ".join(returns) + ")")
+    if fn.get("is_view"):
+        line += " #view"
+    return line
+
+
+def format_struct(struct):
+    abilities = struct.get("abilities", [])
+    fields = ", ".join(f"{f['name']}: {_short_type(f['type'])}" for f in struct.get("fields", []))
+    has = f" has {', '.join(abilities)}" if abilities else ""
+    return f"struct {struct['name']}{_generics(struct.get('generic_type_params'))}{has} {{ {fields} }}"
+
+
+def function_rank(fn):
+    """Higher is more relevant to a security review."""
+    rank = 0
+    if fn.get("is_entry"):
+        rank += 4
+    if fn.get("visibility") == "public":
+        rank += 2
+    if any(p in ("&signer", "signer") for p in fn.get("params", [])):
+        rank += 1
+    if VALUE_MOVING_NAME.search(fn["name"]):
+        rank += 3
+    if fn.get("is_view"):
+        rank -= 6
+    return rank
+
+
+def module_rank(abi, findings):
+    name = f"{abi.get('address')}::{abi.get('name')}"
+    rank = sum(SEVERITY_RANK.get(f["severity"], 0) * 10 for f in findings if f["module"] == name)
+    rank += sum(max(function_rank(fn), 0) for fn in abi.get("exposed_functions", []))
+    return rank
+
+
+def format_module(abi, max_chars=None):
+    """Compact, canonical text for one module ABI, most relevant functions first.
+
+    When max_chars is given, the lowest-ranked functions are dropped (and counted)
+    until the module fits.
+    """
+    friends = abi.get("friends", [])
+    header = f"module {abi.get('address')}::{abi.get('name')}"
+    if friends:
+        header += f" friends[{', '.join(friends)}]"
+    structs = ["  " + format_struct(s) for s in abi.get("structs", [])]
+    functions = sorted(abi.get("exposed_functions", []), key=function_rank, reverse=True)
+    lines = [header] + structs + ["  " + format_function(fn) for fn in functions]
+    text = "\n".join(lines)
+    if max_chars is None or len(text) <= max_chars:
+        return text
+
+    kept = list(lines)
+    dropped = 0
+    while len(kept) > 1 and len("\n".join(kept)) + 40 > max_chars:
+        kept.pop()
+        dropped += 1
+    kept.append(f"  ... {dropped} lower-priority items omitted")
+    return "\n".join(kept)
+
+
+def build_chunks(abis, findings=(), budget=CONTEXT_TOKEN_BUDGET, max_chunks=CONTEXT_MAX_CHUNKS):
+    """Packs module ABIs, highest risk first, into prompt-sized chunks.
+
+    Returns (chunks, omitted) where chunks is a list of context strings that each
+    fit the token budget and omitted lists modules that did not fit in max_chunks.
+    """
+    max_chars = budget * CHARS_PER_TOKEN
+    ranked = sorted(abis, key=lambda abi: module_rank(abi, findings), reverse=True)
+
+    chunks = []
+    current = []
+    current_len = 0
+    omitted = []
+    for abi in ranked:
+        text = format_module(abi, max_chars=max_chars)
+        if current and current_len + len(text) + 1 > max_chars:
+            chunks.append("\n".join(current))
+            current, current_len = [], 0
+        if len(chunks) >= max_chunks:
+            omitted.append(f"{abi.get('address')}::{abi.get('name')}")
+            continue
+        current.append(text)
+        current_len += len(text) + 1
+    if current and len(chunks) < max_chunks:
+        chunks.append("\n".join(current))
+    return chunks, omitted
+
+
+def merge_verdicts(verdicts):
+    """Reduces per-chunk verdicts: the riskiest chunk decides the package verdict."""
+    if not verdicts:
+        return None
+    worst = max(verdicts, key=lambda v: _score(v))
+    risky = [v for v in verdicts if v.get("status") == "Risky"]
+    reasons = [v.get("reason", "") for v in (risky or [worst]) if v.get("reason")]
+    return {
+        "status": "Risky" if risky else worst.get("status", "Unknown"),
+        "risk_score": _score(worst),
+        "reason": " | ".join(reasons),
+    }
+
+
+def _score(verdict):
+    try:
+        return int(verdict.get("risk_score", 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def chunk_modules(chunk):
+    """Names of the modules in a chunk produced by build_chunks, in order."""
+    return re.findall(r"^module [^:\s]+::(\w+)", chunk, re.M)
+
+
+def split_verdict(verdict, names):
+    """Per-module verdicts from a chunk verdict; modules the model did not list inherit the chunk's."""
+    listed = {}
+    for entry in verdict.get("modules") or []:
+        if isinstance(entry, dict) and entry.get("name"):
+            listed[str(entry["name"]).split("::")[-1]] = entry
+    return {name: _module_verdict(listed.get(name, verdict)) for name in names}
+
+
+def _module_verdict(verdict):
+    return {"status": verdict.get("status", "Unknown"), "risk_score": _score(verdict), "reason": verdict.get("reason", "")}
+
+
+def package_verdict(module_verdicts):
+    """Recomputes the package verdict from {module name: verdict}; modules sharing a verdict are grouped."""
+    groups = {}
+    for name, verdict in sorted(module_verdicts.items()):
+        key = (verdict.get("status"), _score(verdict), verdict.get("reason", ""))
+        groups.setdefault(key, []).append(name)
+    return merge_verdicts([
+        {"status": status, "risk_score": score, "reason": f"{', '.join(names)}: {reason}" if reason else ""}
+        for (status, score, reason), names in groups.items()
+    ])
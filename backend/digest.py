@@ -0,0 +1,220 @@
+import re
+import hashlib
+from collections import Counter
+
+from chain import normalize_address
+
+# Condenses a committed transaction into what an audit needs: who signed and paid,
+# what was called, who gained or lost which asset, and which writes touch code,
+# capabilities or ownership. Signatures, raw write-set values and repeated event
+# payloads are left out, so even large transactions fit one prompt.
+
+MAX_ARG_CHARS = 80
+MAX_LIST_ITEMS = 8
+MAX_ACCOUNTS = 20
+MAX_TYPES = 30
+MAX_SENSITIVE = 20
+
+APT = "0x1::aptos_coin::AptosCoin"
+# Metadata object of APT once it moved to the fungible asset standard.
+APT_METADATA = "0xa"
+CAPABILITY_TYPE = re.compile(r"::\w*(Capability|Cap)(<|$)")
+
+
+def _address(value):
+    return normalize_address(str(value))
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _short(value):
+    """Arguments as sent, with long byte strings and lists cut down."""
+    if isinstance(value, str) and len(value) > MAX_ARG_CHARS:
+        return f"{value[:MAX_ARG_CHARS]}... ({len(value)} chars)"
+    if isinstance(value, list):
+        items = [_short(v) for v in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"... {len(value) - MAX_LIST_ITEMS} more")
+        return items
+    if isinstance(value, dict):
+        return {k: _short(v) for k, v in value.items()}
+    return value
+
+
+def _type_args(type_str):
+    """"0x1::coin::CoinStore<0x1::aptos_coin::AptosCoin>" -> "0x1::aptos_coin::AptosCoin"."""
+    return type_str[type_str.index("<") + 1:-1] if type_str.endswith(">") and "<" in type_str else ""
+
+
+def describe_payload(payload):
+    payload = payload or {}
+    kind = payload.get("type", "")
+    if kind == "multisig_payload":
+        inner = describe_payload(payload.get("transaction_payload"))
+        return dict(inner, multisig_address=payload.get("multisig_address"))
+    if kind == "script_payload":
+        bytecode = (payload.get("code") or {}).get("bytecode", "")
+        return {
+            "function": "script",
+            "script_hash": hashlib.sha256(bytecode.encode()).hexdigest()[:16],
+            "type_arguments": payload.get("type_arguments", []),
+            "arguments": _short(payload.get("arguments", [])),
+        }
+    return {
+        "function": payload.get("function", kind or "none"),
+        "type_arguments": payload.get("type_arguments", []),
+        "arguments": _short(payload.get("arguments", [])),
+    }
+
+
+def signers(tx):
+    """(sender, fee payer or None, secondary signers) from the transaction signature."""
+    signature = tx.get("signature") or {}
+    fee_payer = signature.get("fee_payer_address")
+    secondary = [_address(a) for a in signature.get("secondary_signer_addresses") or []]
+    sender = _address(tx["sender"]) if tx.get("sender") else None
+    return sender, _address(fee_payer) if fee_payer else None, secondary
+
+
+def _resources(tx):
+    """(change, address, type, value) for every resource change."""
+    for change in tx.get("changes") or []:
+        if change.get("type") in ("write_resource", "delete_resource"):
+            data = change.get("data") or {}
+            rtype = data.get("type") or change.get("resource") or ""
+            yield change, _address(change.get("address", "0x0")), rtype, data.get("data") or {}
+
+
+def balance_deltas(tx):
+    """{account: {asset: net amount}} from coin and fungible-asset withdraw/deposit events.
+
+    The write set supplies what the events leave out: the owner and asset of a
+    fungible store, and the coin type behind a legacy event handle.
+    """
+    owners, assets, handles = {}, {}, {}
+    for _, address, rtype, value in _resources(tx):
+        if rtype == "0x1::object::ObjectCore" and value.get("owner"):
+            owners[address] = _address(value["owner"])
+        elif rtype == "0x1::fungible_asset::FungibleStore":
+            metadata = (value.get("metadata") or {}).get("inner")
+            if metadata:
+                assets[address] = _address(metadata)
+        elif rtype.startswith("0x1::coin::CoinStore<"):
+            for field in ("deposit_events", "withdraw_events"):
+                guid = (((value.get(field) or {}).get("guid") or {}).get("id") or {})
+                if guid:
+                    handles[(_address(guid.get("addr", "0x0")), str(guid.get("creation_num")))] = _type_args(rtype)
+
+    deltas = {}
+
+    def move(account, asset, amount):
+        if amount:
+            per_account = deltas.setdefault(account, {})
+            per_account[asset] = per_account.get(asset, 0) + amount
+
+    for event in tx.get("events") or []:
+        etype, data = event.get("type", ""), event.get("data") or {}
+        sign = -1 if etype.endswith(("Withdraw", "WithdrawEvent")) else 1
+        amount = sign * _int(data.get("amount"))
+        if etype in ("0x1::coin::CoinWithdraw", "0x1::coin::CoinDeposit"):
+            move(_address(data.get("account", "0x0")), data.get("coin_type", "unknown coin"), amount)
+        elif etype in ("0x1::coin::WithdrawEvent", "0x1::coin::DepositEvent"):
+            guid = event.get("guid") or {}
+            account = _address(guid.get("account_address", "0x0"))
+            move(account, handles.get((account, str(guid.get("creation_number"))), "unknown coin"), amount)
+        elif etype in ("0x1::fungible_asset::Withdraw", "0x1::fungible_asset::Deposit"):
+            store = _address(data.get("store", "0x0"))
+            asset = assets.get(store, "unknown asset")
+            move(owners.get(store, f"store {store}"), APT if asset == APT_METADATA else asset, amount)
+
+    deltas = {account: {a: v for a, v in moved.items() if v} for account, moved in deltas.items()}
+    deltas = {account: moved for account, moved in deltas.items() if moved}
+    # Largest movements first; the long tail is only counted.
+    ranked = sorted(deltas.items(), key=lambda item: -max(abs(v) for v in item[1].values()))
+    return dict(ranked[:MAX_ACCOUNTS]), max(len(ranked) - MAX_ACCOUNTS, 0)
+
+
+def sensitive_writes(tx, signer_addresses):
+    """Writes worth a second look: code, capabilities, capability offers, ownership handed out."""
+    notes = []
+    published = {}
+    for change in tx.get("changes") or []:
+        if change.get("type") == "write_module":
+            name = ((change.get("data") or {}).get("abi") or {}).get("name", "?")
+            published.setdefault(_address(change.get("address", "0x0")), []).append(name)
+    for address, names in published.items():
+        notes.append(f"code published at {address}: {', '.join(sorted(names))}")
+
+    stores = {address for _, address, rtype, _ in _resources(tx) if rtype == "0x1::fungible_asset::FungibleStore"}
+    for change, address, rtype, value in _resources(tx):
+        if rtype == "0x1::code::PackageRegistry":
+            notes.append(f"package registry updated at {address}")
+        elif CAPABILITY_TYPE.search(rtype.split("<")[0]):
+            verb = "removed from" if change["type"] == "delete_resource" else "stored at"
+            notes.append(f"capability {rtype} {verb} {address}")
+        elif rtype == "0x1::account::Account":
+            for offer in ("signer_capability_offer", "rotation_capability_offer"):
+                offered_to = ((value.get(offer) or {}).get("for") or {}).get("vec") or []
+                if offered_to:
+                    notes.append(f"{offer.replace('_', ' ')} of {address} made to {_address(offered_to[0])}")
+        elif rtype == "0x1::object::ObjectCore" and value.get("owner") and address not in stores:
+            owner = _address(value["owner"])
+            if owner not in signer_addresses:
+                notes.append(f"object {address} owned by {owner}, which did not sign")
+    if len(notes) > MAX_SENSITIVE:
+        notes = notes[:MAX_SENSITIVE] + [f"... {len(notes) - MAX_SENSITIVE} more"]
+    return notes
+
+
+def _top(counter, limit=MAX_TYPES):
+    top = dict(counter.most_common(limit))
+    rest = sum(counter.values()) - sum(top.values())
+    if rest:
+        top["other"] = rest
+    return top
+
+
+def digest_transaction(tx):
+    """Small structured summary of a transaction as returned by /transactions/by_hash."""
+    sender, fee_payer, secondary = signers(tx)
+    signer_addresses = {a for a in [sender, fee_payer, *secondary] if a}
+    gas_used, gas_price = _int(tx.get("gas_used")), _int(tx.get("gas_unit_price"))
+
+    writes = Counter()
+    for change in tx.get("changes") or []:
+        kind = change.get("type", "change")
+        if kind in ("write_resource", "delete_resource"):
+            writes[f"{kind} {(change.get('data') or {}).get('type') or change.get('resource', '')}"] += 1
+        else:
+            writes[kind] += 1
+    deltas, more_accounts = balance_deltas(tx)
+
+    digest = {
+        "type": tx.get("type"),
+        "version": tx.get("version"),
+        "success": tx.get("success"),
+        "vm_status": tx.get("vm_status"),
+        "sender": sender,
+        "fee_payer": fee_payer,
+        "secondary_signers": secondary,
+        **describe_payload(tx.get("payload")),
+        "gas": {
+            "used": gas_used,
+            "unit_price": gas_price,
+            "max_amount": _int(tx.get("max_gas_amount")),
+            "fee_octas": gas_used * gas_price,
+            "paid_by": fee_payer or sender,
+        },
+        "balance_deltas": deltas,
+        "writes": _top(writes),
+        "sensitive": sensitive_writes(tx, signer_addresses),
+        "events": _top(Counter(event.get("type", "?") for event in tx.get("events") or [])),
+    }
+    if more_accounts:
+        digest["balance_deltas_omitted_accounts"] = more_accounts
+    return digest
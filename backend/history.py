@@ -0,0 +1,154 @@
+import os
+import time
+import asyncio
+import sqlite3
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+
+from cache import connect_sqlite, fingerprint
+
+# SQLite file holding every audit verdict, per package and per module. Empty (the default) keeps it in memory.
+AUDIT_HISTORY_PATH = os.getenv("AUDIT_HISTORY_PATH", "")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS module_verdicts (
+    address TEXT NOT NULL,
+    module TEXT NOT NULL,
+    bytecode_hash TEXT NOT NULL,
+    prompt_version TEXT NOT NULL,
+    status TEXT NOT NULL,
+    risk_score INTEGER NOT NULL,
+    reason TEXT,
+    audited_at REAL NOT NULL,
+    PRIMARY KEY (address, module, bytecode_hash, prompt_version)
+);
+CREATE INDEX IF NOT EXISTS module_verdicts_by_address ON module_verdicts (address, audited_at);
+CREATE INDEX IF NOT EXISTS module_verdicts_by_status ON module_verdicts (status, audited_at);
+
+CREATE TABLE IF NOT EXISTS package_audits (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    address TEXT NOT NULL,
+    status TEXT NOT NULL,
+    risk_score INTEGER NOT NULL,
+    reason TEXT,
+    source TEXT NOT NULL,
+    modules_audited INTEGER NOT NULL,
+    modules_reused INTEGER NOT NULL,
+    audited_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS package_audits_by_address ON package_audits (address, audited_at);
+"""
+
+
+def module_hash(module):
+    """sha256 of the module bytecode; modules served without bytecode hash their ABI instead."""
+    bytecode = module.get("bytecode")
+    if bytecode:
+        return hashlib.sha256(bytecode.encode()).hexdigest()
+    return fingerprint(module.get("abi"))
+
+
+class AuditHistory:
+    """Per-module and per-package verdicts, so upgrades only re-audit the modules that changed.
+
+    The file is shared by every worker and a write may wait on another worker's lock,
+    so all queries run on a dedicated thread instead of the event loop.
+    """
+
+    def __init__(self, path=AUDIT_HISTORY_PATH):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audit-history")
+        self.conn = connect_sqlite(path or ":memory:")
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+        self.conn.commit()
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+
+    async def known_modules(self, address, hashes, prompt_version):
+        """{module name: verdict} for the modules whose current bytecode was already audited."""
+        if not hashes:
+            return {}
+        return await self._run(self._known_modules, address, hashes, prompt_version)
+
+    async def record_modules(self, address, verdicts, prompt_version):
+        """verdicts: [{"name", "bytecode_hash", "status", "risk_score", "reason"}]"""
+        await self._run(self._record_modules, address, verdicts, prompt_version)
+
+    async def record_package(self, address, result, source, audited=0, reused=0):
+        await self._run(self._record_package, address, result, source, audited, reused)
+
+    async def latest_risky(self, limit=50):
+        """Most recently audited modules judged Risky."""
+        return await self._run(self._latest_risky, limit)
+
+    async def address_history(self, address, limit=50):
+        """Package audits of address, newest first, plus every module verdict recorded for it."""
+        return await self._run(self._address_history, address, limit)
+
+    def _known_modules(self, address, hashes, prompt_version):
+        rows = self.conn.execute(
+            "SELECT module, bytecode_hash, status, risk_score, reason FROM module_verdicts "
+            "WHERE address = ? AND prompt_version = ?",
+            (address, prompt_version),
+        ).fetchall()
+        return {
+            row["module"]: {"status": row["status"], "risk_score": row["risk_score"], "reason": row["reason"]}
+            for row in rows
+            if hashes.get(row["module"]) == row["bytecode_hash"]
+        }
+
+    def _record_modules(self, address, verdicts, prompt_version):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO module_verdicts "
+            "(address, module, bytecode_hash, prompt_version, status, risk_score, reason, audited_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (address, v["name"], v["bytecode_hash"], prompt_version, v["status"], v["risk_score"], v["reason"], now)
+                for v in verdicts
+            ],
+        )
+        self.conn.commit()
+
+    def _record_package(self, address, result, source, audited, reused):
+        self.conn.execute(
+            "INSERT INTO package_audits "
+            "(address, status, risk_score, reason, source, modules_audited, modules_reused, audited_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (address, result.get("status", "Unknown"), _int(result.get("risk_score")), result.get("reason"),
+             source, audited, reused, time.time()),
+        )
+        self.conn.commit()
+
+    def _latest_risky(self, limit):
+        rows = self.conn.execute(
+            "SELECT address, module, bytecode_hash, risk_score, reason, audited_at FROM module_verdicts "
+            "WHERE status = 'Risky' ORDER BY audited_at DESC LIMIT ?",
+            (limit,),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _address_history(self, address, limit):
+        audits = self.conn.execute(
+            "SELECT status, risk_score, reason, source, modules_audited, modules_reused, audited_at "
+            "FROM package_audits WHERE address = ? ORDER BY audited_at DESC LIMIT ?",
+            (address, limit),
+        ).fetchall()
+        modules = self.conn.execute(
+            "SELECT module, bytecode_hash, prompt_version, status, risk_score, reason, audited_at "
+            "FROM module_verdicts WHERE address = ? ORDER BY audited_at DESC LIMIT ?",
+            (address, limit),
+        ).fetchall()
+        return {"address": address, "audits": [dict(r) for r in audits], "modules": [dict(r) for r in modules]}
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.conn.close()
+
+
+def _int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
@@ -0,0 +1,236 @@
+import os
+import json
+import asyncio
+try:
+    import fcntl
+except ImportError:  # Windows: single-process dev server only
+    fcntl = None
+from collections import OrderedDict
+
+from chain import normalize_address
+from llm import CallBudget, charge_to
+from metrics import INDEXER_AUDITS, INDEXER_PUBLISHES, INDEXER_QUEUE, INDEXER_VERSION
+
+# Follows new transactions and pre-audits freshly published or upgraded modules,
+# so the verdict is already cached when the first user asks for it. Off by default.
+INDEXER_ENABLED = os.getenv("INDEXER_ENABLED", "0") == "1"
+INDEXER_POLL_SECONDS = float(os.getenv("INDEXER_POLL_SECONDS", "2"))
+INDEXER_PAGE_SIZE = int(os.getenv("INDEXER_PAGE_SIZE", "100"))
+# Queued addresses beyond this make the follower stop reading the chain until workers catch up.
+INDEXER_QUEUE_SIZE = int(os.getenv("INDEXER_QUEUE_SIZE", "256"))
+INDEXER_WORKERS = int(os.getenv("INDEXER_WORKERS", "2"))
+# Model calls the indexer may start per minute, on top of (and sharing keys with) user traffic.
+INDEXER_LLM_CALLS_PER_MINUTE = float(os.getenv("INDEXER_LLM_CALLS_PER_MINUTE", "10"))
+INDEXER_CHECKPOINT_PATH = os.getenv("INDEXER_CHECKPOINT_PATH", "indexer_checkpoint.json")
+
+PUBLISH_FUNCTIONS = {
+    "0x1::code::publish_package_txn",
+    "0x1::object_code_deployment::publish",
+    "0x1::object_code_deployment::upgrade",
+}
+
+# Upgrades jump the queue: they change code people may already be using.
+UPGRADE, PUBLISH = 0, 1
+
+
+def published_addresses(tx):
+    """Addresses whose modules a committed transaction wrote, from its write set (payload as fallback)."""
+    if tx.get("type") != "user_transaction" or not tx.get("success"):
+        return []
+    addresses = []
+    for change in tx.get("changes") or []:
+        if change.get("type") == "write_module":
+            address = normalize_address(change["address"])
+            if address not in addresses:
+                addresses.append(address)
+    if not addresses and (tx.get("payload") or {}).get("function") in PUBLISH_FUNCTIONS:
+        addresses.append(normalize_address(tx["sender"]))
+    return addresses
+
+
+class Checkpoint:
+    """Last fully processed ledger version, kept in a small JSON file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock_file = None
+
+    def try_lock(self):
+        """True if this process may own the checkpoint; only one worker process runs the indexer."""
+        if not self.path or fcntl is None or self.lock_file is not None:
+            return True
+        lock_file = open(self.path + ".lock", "w")
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        self.lock_file = lock_file
+        return True
+
+    def unlock(self):
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path) as f:
+                return int(json.load(f)["version"])
+        except (ValueError, KeyError, OSError) as e:
+            print(f"Ignoring unreadable indexer checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, version):
+        if not self.path:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump({"version": version}, f)
+        os.replace(tmp, self.path)
+
+
+class ChainIndexer:
+    """Polls `client.transactions` and feeds published addresses to `audit(address)`.
+
+    - A bounded priority queue sits between the follower and the workers; when it
+      is full the follower blocks, so the indexer never reads further ahead of
+      the audits than the queue allows.
+    - An address already waiting is not queued twice.
+    - The checkpoint only moves past a version once every address it published
+      has been audited, so a restart resumes without losing work.
+    - Model calls made by the workers are charged to their own per-minute budget.
+    """
+
+    def __init__(self, client, audit, checkpoint_path=INDEXER_CHECKPOINT_PATH, queue_size=INDEXER_QUEUE_SIZE,
+                 workers=INDEXER_WORKERS, poll_seconds=INDEXER_POLL_SECONDS, page_size=INDEXER_PAGE_SIZE,
+                 llm_calls_per_minute=INDEXER_LLM_CALLS_PER_MINUTE):
+        self.client = client
+        self.audit = audit
+        self.checkpoint = Checkpoint(checkpoint_path)
+        self.queue = asyncio.PriorityQueue(maxsize=queue_size)
+        self.workers = workers
+        self.poll_seconds = poll_seconds
+        self.page_size = page_size
+        self.budget = CallBudget(llm_calls_per_minute)
+        self.waiting = set()  # addresses queued and not yet picked up by a worker
+        self.pending = set()  # (version, address) queued or being audited
+        self.published = OrderedDict()  # addresses seen publishing before, to spot upgrades
+        self.next_version = None
+        self.saved_version = None
+        self.tasks = []
+
+    def start(self):
+        self.tasks = [asyncio.ensure_future(self.run())]
+
+    async def run(self):
+        # With several worker processes the others stand by, taking over if the owner exits.
+        while not self.checkpoint.try_lock():
+            await asyncio.sleep(self.poll_seconds * 5)
+        saved = self.checkpoint.load()
+        self.next_version = None if saved is None else saved + 1
+        print(f"Chain indexer started at version {self.next_version if saved is not None else 'tip'}")
+        self.tasks += [asyncio.ensure_future(self.work()) for _ in range(self.workers)]
+        await self.follow()
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.save_checkpoint()
+        self.checkpoint.unlock()
+
+    def processed_version(self):
+        """Highest version with nothing left to audit at or below it."""
+        if self.next_version is None:
+            return None
+        if self.pending:
+            return min(version for version, _ in self.pending) - 1
+        return self.next_version - 1
+
+    def save_checkpoint(self):
+        version = self.processed_version()
+        if version is not None and version >= 0 and version != self.saved_version:
+            self.checkpoint.save(version)
+            self.saved_version = version
+            INDEXER_VERSION.set(version)
+
+    async def follow(self):
+        while True:
+            try:
+                txs = await self.fetch_page()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Indexer fetch failed: {e}")
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            if not txs:
+                self.save_checkpoint()
+                await asyncio.sleep(self.poll_seconds)
+                continue
+            for tx in txs:
+                version = int(tx["version"])
+                upgrade = (tx.get("payload") or {}).get("function") == "0x1::object_code_deployment::upgrade"
+                for address in published_addresses(tx):
+                    await self.enqueue(address, version, upgrade)
+                self.next_version = version + 1
+            self.save_checkpoint()
+            if len(txs) < self.page_size:
+                await asyncio.sleep(self.poll_seconds)
+
+    async def fetch_page(self):
+        from aptos_sdk.async_client import ApiError
+
+        if self.next_version is None:
+            # No checkpoint: start from the tip instead of replaying history.
+            latest = await self.client.transactions(limit=1)
+            if latest:
+                self.next_version = int(latest[-1]["version"]) + 1
+            return []
+        try:
+            return await self.client.transactions(limit=self.page_size, start=self.next_version)
+        except ApiError as e:
+            if e.status_code != 410:
+                raise
+            print(f"Indexer version {self.next_version} was pruned, jumping to the tip")
+            self.next_version = None
+            return []
+
+    async def enqueue(self, address, version, upgrade=False):
+        upgrade = upgrade or address in self.published
+        self.published[address] = True
+        self.published.move_to_end(address)
+        while len(self.published) > 100000:
+            self.published.popitem(last=False)
+        INDEXER_PUBLISHES.inc(kind="upgrade" if upgrade else "publish")
+        if address in self.waiting:
+            return  # The queued audit will fetch the newest code anyway.
+        self.waiting.add(address)
+        self.pending.add((version, address))
+        if self.queue.full():
+            print(f"Indexer queue full ({self.queue.maxsize}), pausing at version {version}")
+        # Blocks while the queue is full: backpressure on the follower.
+        await self.queue.put((UPGRADE if upgrade else PUBLISH, -version, address))
+        INDEXER_QUEUE.set(self.queue.qsize())
+
+    async def work(self):
+        charge_to(self.budget)
+        while True:
+            _, version, address = await self.queue.get()
+            version = -version
+            self.waiting.discard(address)
+            INDEXER_QUEUE.set(self.queue.qsize())
+            try:
+                await self.audit(address)
+                INDEXER_AUDITS.inc(outcome="ok")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                INDEXER_AUDITS.inc(outcome="error")
+                print(f"Indexer pre-audit of {address} failed: {e}")
+            finally:
+                self.pending.discard((version, address))
+                self.queue.task_done()
@@ -0,0 +1,394 @@
+import os
+import time
+import asyncio
+import hashlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import grpc
+
+from cache import connect_sqlite
+from context import estimate_tokens
+from metrics import LLM_CALLS, LLM_SECONDS
+
+# google.generativeai takes about a second to import, so it is only loaded when a
+# model is first built (or by warm_up() in the background at startup).
+
+
+def _load_keys():
+    """GEMINI_API_KEY, GEMINI_API_KEY_BACKUP, then any other GEMINI_API_KEY* in name order."""
+    names = ["GEMINI_API_KEY", "GEMINI_API_KEY_BACKUP"]
+    names += sorted(n for n in os.environ if n.startswith("GEMINI_API_KEY") and n not in names)
+    keys = []
+    for name in names:
+        key = os.getenv(name)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+
+GEMINI_KEYS = _load_keys()
+
+MODEL_NAME = "gemini-1.5-pro"
+
+# host:port of a plaintext gRPC Gemini stand-in (see standins.py). Empty uses the real API.
+GEMINI_API_ENDPOINT = os.getenv("GEMINI_API_ENDPOINT", "")
+
+# How many model calls a single worker keeps in flight, and how long one may take.
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# SQLite file holding per-key quota state, so worker processes share one budget per key.
+# Empty keeps the buckets in this process only.
+GEMINI_QUOTA_PATH = os.getenv("GEMINI_QUOTA_PATH", "")
+
+# Per-key quota, matched to the plan the keys are on, and how long a key rests after a 429.
+GEMINI_KEY_RPM = float(os.getenv("GEMINI_KEY_RPM", "60"))
+GEMINI_KEY_TPM = float(os.getenv("GEMINI_KEY_TPM", "1000000"))
+GEMINI_KEY_COOLDOWN_SECONDS = float(os.getenv("GEMINI_KEY_COOLDOWN_SECONDS", "60"))
+# Tokens budgeted for the reply when charging a request against TPM.
+EXPECTED_OUTPUT_TOKENS = 512
+
+_in_flight = asyncio.Semaphore(LLM_MAX_IN_FLIGHT)
+
+
+class LLMTimeout(Exception):
+    """The model did not answer within LLM_TIMEOUT_SECONDS"""
+
+
+def warm_up():
+    """Imports the Gemini SDK ahead of the first model call; safe to run in a thread."""
+    import google.generativeai  # noqa: F401
+    import google.ai.generativelanguage  # noqa: F401
+
+
+def is_quota_error(e):
+    return "429" in str(e) or "quota" in str(e).lower()
+
+
+def quota_tokens(prompt):
+    """Tokens a call is charged against TPM: the prompt (as the metrics count it) plus the expected reply."""
+    return estimate_tokens(prompt) + EXPECTED_OUTPUT_TOKENS
+
+
+class TokenBucket:
+    def __init__(self, per_minute):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.tokens = per_minute
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount):
+        self.tokens -= min(amount, self.capacity)
+
+
+class KeySlot:
+    """One API key with its own quota buckets and a reusable model client."""
+
+    def __init__(self, index, key):
+        self.index = index
+        self.key = key
+        self.requests = TokenBucket(GEMINI_KEY_RPM)
+        self.tokens = TokenBucket(GEMINI_KEY_TPM)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self._model = None
+
+    def model(self):
+        # Built once per key on first use, instead of genai.configure() on every call.
+        if self._model is None:
+            import google.generativeai as genai
+
+            model = genai.GenerativeModel(MODEL_NAME)
+            # GenerativeModel has no client argument and otherwise uses the global genai.configure()
+            # key; this attribute is the only SDK internal the pool relies on.
+            model._async_client = _async_client(self.key)
+            self._model = model
+        return self._model
+
+    def wait_time(self, tokens, now):
+        return max(
+            self.cooldown_until - now,
+            self.requests.wait_time(1, now),
+            self.tokens.wait_time(tokens, now),
+        )
+
+
+def _with_api_key(details, key):
+    # Plaintext channels drop call credentials, so the key travels as plain metadata.
+    metadata = list(details.metadata or []) + [("x-goog-api-key", key)]
+    return grpc.aio.ClientCallDetails(
+        details.method, details.timeout, metadata, details.credentials, details.wait_for_ready
+    )
+
+
+class _UnaryApiKey(grpc.aio.UnaryUnaryClientInterceptor):
+    def __init__(self, key):
+        self.key = key
+
+    async def intercept_unary_unary(self, continuation, details, request):
+        return await continuation(_with_api_key(details, self.key), request)
+
+
+class _StreamApiKey(grpc.aio.UnaryStreamClientInterceptor):
+    def __init__(self, key):
+        self.key = key
+
+    async def intercept_unary_stream(self, continuation, details, request):
+        return await continuation(_with_api_key(details, self.key), request)
+
+
+def _async_client(key):
+    """A GenerativeServiceAsyncClient bound to one key, or to the stand-in at GEMINI_API_ENDPOINT."""
+    import google.ai.generativelanguage as glm
+
+    if GEMINI_API_ENDPOINT:
+        return _plaintext_client(key)
+    return glm.GenerativeServiceAsyncClient(client_options={"api_key": key})
+
+
+def _plaintext_client(key):
+    import google.ai.generativelanguage as glm
+    from google.ai.generativelanguage_v1beta.services.generative_service.transports.grpc_asyncio import (
+        GenerativeServiceGrpcAsyncIOTransport,
+    )
+
+    channel = grpc.aio.insecure_channel(GEMINI_API_ENDPOINT, interceptors=[_UnaryApiKey(key), _StreamApiKey(key)])
+    return glm.GenerativeServiceAsyncClient(transport=GenerativeServiceGrpcAsyncIOTransport(channel=channel))
+
+
+class SharedQuota:
+    """Bucket levels and cooldowns kept in SQLite so every worker process draws on the same quota.
+
+    Times are time.monotonic(), which is system-wide, so all workers on the host agree on them.
+    Keys are stored by hash, never in clear. The SQLite lock can be contended by every
+    worker, so syncs run on a dedicated thread instead of the event loop.
+    """
+
+    def __init__(self, path):
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="gemini-quota")
+        self.conn = connect_sqlite(path)
+        self.conn.isolation_level = None  # transactions are managed explicitly below
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS key_quota (key_id TEXT PRIMARY KEY, requests REAL, tokens REAL, "
+            "updated REAL, cooldown_until REAL)"
+        )
+
+    @staticmethod
+    def key_id(slot):
+        return hashlib.sha256(slot.key.encode()).hexdigest()[:16]
+
+    @contextmanager
+    def locked(self, slots):
+        """Loads the shared state into slots, lets the caller update them, then writes it back."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = {row[0]: row[1:] for row in self.conn.execute("SELECT * FROM key_quota")}
+            for slot in slots:
+                row = rows.get(self.key_id(slot))
+                if row:
+                    slot.requests.tokens, slot.tokens.tokens, updated, slot.cooldown_until = row
+                    slot.requests.updated = slot.tokens.updated = updated
+            yield
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO key_quota VALUES (?, ?, ?, ?, ?)",
+                [(self.key_id(s), s.requests.tokens, s.tokens.tokens, s.requests.updated, s.cooldown_until) for s in slots],
+            )
+            self.conn.execute("COMMIT")
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    async def run(self, slots, fn, *args):
+        """fn(*args) on the quota thread, with slots holding the shared state while it runs."""
+        def synced():
+            with self.locked(slots):
+                return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self.executor, synced)
+
+
+class KeyPool:
+    """Hands out the least-loaded key that has quota left, waiting instead of provoking 429s."""
+
+    def __init__(self, keys, quota=None):
+        self.slots = [KeySlot(i, key) for i, key in enumerate(keys)]
+        self.quota = quota
+
+    async def _synced(self, fn, *args):
+        if self.quota is None:
+            return fn(*args)
+        return await self.quota.run(self.slots, fn, *args)
+
+    async def acquire(self, tokens):
+        while True:
+            slot, wait = await self._synced(self._take, tokens)
+            if slot is not None:
+                return slot
+            await asyncio.sleep(wait)
+
+    def _take(self, tokens):
+        """(slot, 0) with its quota taken, or (None, seconds until one could have it)."""
+        now = time.monotonic()
+        ready = [slot for slot in self.slots if slot.wait_time(tokens, now) <= 0]
+        if not ready:
+            return None, min(slot.wait_time(tokens, now) for slot in self.slots)
+        slot = min(ready, key=lambda s: (s.in_flight, -s.requests.tokens))
+        slot.requests.take(1)
+        slot.tokens.take(tokens)
+        slot.in_flight += 1
+        return slot, 0
+
+    def release(self, slot):
+        slot.in_flight -= 1
+
+    async def cool_down(self, slot):
+        def rest():
+            slot.cooldown_until = time.monotonic() + GEMINI_KEY_COOLDOWN_SECONDS
+        await self._synced(rest)
+        print(f"Gemini key {slot.index} hit its quota, resting {GEMINI_KEY_COOLDOWN_SECONDS}s")
+
+
+key_pool = KeyPool(GEMINI_KEYS, SharedQuota(GEMINI_QUOTA_PATH) if GEMINI_QUOTA_PATH else None)
+
+
+class CallBudget:
+    """Caps how many model calls a background job may start per minute."""
+
+    def __init__(self, per_minute):
+        self.bucket = TokenBucket(per_minute)
+
+    async def acquire(self):
+        while True:
+            wait = self.bucket.wait_time(1, time.monotonic())
+            if wait <= 0:
+                self.bucket.take(1)
+                return
+            await asyncio.sleep(wait)
+
+
+# Set by background work (the chain indexer) so its model calls are charged to its own budget.
+_budget = contextvars.ContextVar("llm_budget", default=None)
+
+
+def charge_to(budget):
+    """Charges every model call made from the current task (and tasks it spawns) to budget."""
+    _budget.set(budget)
+
+
+def uncharged_context():
+    """Copy of the current context with no budget, for work that user requests may join."""
+    context = contextvars.copy_context()
+    context.run(_budget.set, None)
+    return context
+
+
+async def _spend_budget():
+    budget = _budget.get()
+    if budget is not None:
+        await budget.acquire()
+
+
+async def _start(prompt, deadline, **kwargs):
+    """Starts a generation on the best available key, moving to another key on quota errors.
+
+    Returns (slot, response); the caller must release the slot.
+    """
+    loop = asyncio.get_running_loop()
+    tokens = quota_tokens(prompt)
+    last_error = None
+    for _ in range(len(key_pool.slots)):
+        slot = await asyncio.wait_for(key_pool.acquire(tokens), deadline - loop.time())
+        key = str(slot.index)
+        started = time.perf_counter()
+        try:
+            response = await asyncio.wait_for(
+                slot.model().generate_content_async(prompt, **kwargs), deadline - loop.time()
+            )
+            LLM_CALLS.inc(key=key, outcome="ok")
+            return slot, response
+        except asyncio.TimeoutError:
+            key_pool.release(slot)
+            LLM_CALLS.inc(key=key, outcome="timeout")
+            raise
+        except Exception as e:
+            key_pool.release(slot)
+            print(f"Gemini Error (Key {slot.index}): {e}")
+            if not is_quota_error(e):
+                LLM_CALLS.inc(key=key, outcome="error")
+                raise
+            LLM_CALLS.inc(key=key, outcome="quota")
+            await key_pool.cool_down(slot)
+            last_error = e
+        except BaseException:
+            # Cancelled (client went away): hand the key back before propagating.
+            key_pool.release(slot)
+            LLM_CALLS.inc(key=key, outcome="cancelled")
+            raise
+        finally:
+            # Until the reply (or, when streaming, its first chunk) arrives.
+            LLM_SECONDS.observe(time.perf_counter() - started, key=key)
+    raise last_error
+
+
+async def generate_safe(prompt, timeout=None):
+    """Generates on the least-loaded key, retrying on another key after a 429/quota error.
+
+    Runs on the event loop via the native async client, bounded by
+    LLM_MAX_IN_FLIGHT concurrent calls and a per-call timeout.
+    """
+    if not GEMINI_KEYS:
+        return None
+
+    await _spend_budget()
+    timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+    deadline = asyncio.get_running_loop().time() + timeout
+    async with _in_flight:
+        try:
+            slot, response = await _start(prompt, deadline)
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"Gemini did not respond within {timeout}s")
+        key_pool.release(slot)
+        return response
+
+
+async def generate_stream(prompt, timeout=None):
+    """Like generate_safe, but yields the response text piece by piece as Gemini produces it.
+
+    Key failover only happens before the first chunk; the timeout covers the whole stream.
+    """
+    if not GEMINI_KEYS:
+        return
+
+    await _spend_budget()
+    timeout = LLM_TIMEOUT_SECONDS if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    async with _in_flight:
+        try:
+            slot, response = await _start(prompt, deadline, stream=True)
+        except asyncio.TimeoutError:
+            raise LLMTimeout(f"Gemini did not respond within {timeout}s")
+        try:
+            chunks = response.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), deadline - loop.time())
+                except StopAsyncIteration:
+                    return
+                except asyncio.TimeoutError:
+                    raise LLMTimeout(f"Gemini did not finish within {timeout}s")
+                yield chunk.text
+        finally:
+            key_pool.release(slot)
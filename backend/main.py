@@ -1,12 +1,26 @@
 import os
+import json
+import time
+import asyncio
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
-import google.generativeai as genai
 from dotenv import load_dotenv
 
 load_dotenv()
 
+from llm import GEMINI_KEYS, LLMTimeout, generate_safe, generate_stream, uncharged_context, warm_up
+from cache import AuditCache, SingleFlight, fingerprint
+from chain import ModuleCache, make_rest_client, resolve_target, normalize_address, classify_target
+from prescreen import prescreen, format_findings
+from context import build_chunks, estimate_tokens, chunk_modules, split_verdict, package_verdict
+from history import AuditHistory, module_hash
+from digest import digest_transaction
+from callgraph import analyze_package, format_reach
+from indexer import INDEXER_ENABLED, ChainIndexer
+import metrics
+
 from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
@@ -19,66 +33,89 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Mock setup removed. We enforce Real SDK.
-try:
-    from aptos_sdk.async_client import RestClient
-    from aptos_sdk.transactions import EntryFunction, TransactionArgument
-    NODE_URL = "https://fullnode.devnet.aptoslabs.com/v1"
-    # client initialized in startup
-except ImportError:
-    # This should now crash if dependencies are missing, which is good for "Real" mode.
-    raise ImportError("aptos_sdk not found. Please install requirements.txt")
+# Mock setup removed. We enforce Real SDK: aptos_sdk is imported when the client is built at
+# startup (and by the simulate path), not when this module loads, so workers start faster.
+NODE_URL = os.getenv("APTOS_NODE_URL", "https://fullnode.devnet.aptoslabs.com/v1")
 
 client = None # Global placeholder
+module_cache = None # Wraps client, created in startup
+audit_cache = AuditCache()
+audit_flights = SingleFlight()
+audit_history = AuditHistory()
+indexer = None # Background pre-auditor, only with INDEXER_ENABLED=1
 
-# Gemini Setup with Fallback
-GEMINI_KEYS = []
-if os.getenv("GEMINI_API_KEY"):
-    GEMINI_KEYS.append(os.getenv("GEMINI_API_KEY"))
-if os.getenv("GEMINI_API_KEY_BACKUP"):
-    GEMINI_KEYS.append(os.getenv("GEMINI_API_KEY_BACKUP"))
+# Bump whenever the audit prompt changes so cached verdicts from the old prompt are not reused.
+AUDIT_PROMPT_VERSION = "6"
 
-current_key_index = 0
+# Batch audits: how many targets one request may carry and how many run at once.
+BATCH_MAX_TARGETS = int(os.getenv("BATCH_MAX_TARGETS", "500"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "16"))
+
+# How often a long-running request checks whether its client is still connected.
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", "0.5"))
+
+class ServerTimingMiddleware:
+    """Per-request latency metrics plus a Server-Timing header with the pipeline stages.
+
+    Plain ASGI rather than @app.middleware("http"): BaseHTTPMiddleware hides the
+    client's http.disconnect from the endpoint, which cancel_on_disconnect relies on.
+    Streamed responses send their headers before the pipeline runs, so they only carry `total`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        timings = metrics.begin_request()
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                header = metrics.server_timing(timings + [("total", time.perf_counter() - start)])
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode())]
+            await send(message)
 
-def get_gemini_model():
-    global current_key_index
-    if not GEMINI_KEYS:
-        return None
-    
-    # Configure with current key
-    genai.configure(api_key=GEMINI_KEYS[current_key_index])
-    return genai.GenerativeModel('gemini-1.5-pro')
-
-def rotate_key():
-    global current_key_index
-    if len(GEMINI_KEYS) > 1:
-        current_key_index = (current_key_index + 1) % len(GEMINI_KEYS)
-        print(f"Switching to API Key Index: {current_key_index}")
-        return True
-    return False
-
-def generate_safe(prompt):
-    """Attempts generation, retries with backup key on 429/Error"""
-    if not GEMINI_KEYS:
-        return None
-    
-    attempts = len(GEMINI_KEYS)
-    for _ in range(attempts):
         try:
-            model = get_gemini_model()
-            return model.generate_content(prompt)
-        except Exception as e:
-            print(f"Gemini Error (Key {current_key_index}): {e}")
-            if "429" in str(e) or "quota" in str(e).lower():
-                if rotate_key():
-                    continue # Retry with new key
-            raise e # If not quota error or no keys left, raise
-    return None
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            metrics.REQUEST_SECONDS.observe(
+                time.perf_counter() - start, path=route.path if route else "unmatched", status=status
+            )
+
+app.add_middleware(ServerTimingMiddleware)
+
+class ClientDisconnected(Exception):
+    """The HTTP client went away before the response was ready"""
+
+async def cancel_on_disconnect(http_request: Request, coro):
+    """Runs coro, cancelling it (and any model call inside it) if the client disconnects."""
+    task = asyncio.ensure_future(coro)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                print(f"Client disconnected, cancelling {http_request.url.path}")
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
 
 class AuditRequest(BaseModel):
     target: str # Address or Transaction Hash
     type: str # "address" or "transaction"
 
+class AuditBatchRequest(BaseModel):
+    targets: list[AuditRequest]
+
 class SimulationRequest(BaseModel):
     sender: str
     function_id: str
@@ -87,193 +124,596 @@ class SimulationRequest(BaseModel):
 
 @app.on_event("startup")
 async def startup_event():
-    global client
-    client = RestClient(NODE_URL)
+    global client, module_cache, indexer
+    client = await make_rest_client(NODE_URL)
+    module_cache = ModuleCache(client)
+    if GEMINI_KEYS:
+        # Load the Gemini SDK off the event loop so the worker can serve requests meanwhile.
+        asyncio.get_running_loop().run_in_executor(None, warm_up)
+    if INDEXER_ENABLED:
+        indexer = ChainIndexer(client, pre_audit)
+        indexer.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
+    if indexer:
+        await indexer.stop()
     if client:
         await client.close()
+    audit_cache.close()
+    audit_history.close()
+
+def screen_hint(screen, context=None):
+    if not screen:
+        return ""
+    findings = screen["findings"]
+    if context is not None:
+        # Only the findings for modules that are actually in this prompt.
+        findings = [f for f in findings if f"module {f['module']}" in context]
+    if not findings:
+        return ""
+    return "Static pre-screen findings (rule-based, from the ABI; confirm or refute them):\n" + format_findings(findings)
+
+def reach_hash(bytecode_hash, module, reach):
+    """Bytecode hash, extended with the module's reach report when its entry functions reach sensitive calls."""
+    own = [r for r in reach if r["entry"].split("::")[1] == module]
+    return fingerprint(bytecode_hash, own) if own else bytecode_hash
+
+def call_hint(reach, context):
+    # Only the entry functions of modules that are actually in this prompt.
+    names = set(chunk_modules(context))
+    reach = [r for r in reach if r["entry"].split("::")[1] in names]
+    if not reach:
+        return ""
+    return "Sensitive calls reachable from entry functions (from the bytecode call graph):\n" + format_reach(reach)
+
+async def run_request(http_request: Request, coro):
+    """Maps cancellation and model timeouts onto HTTP errors."""
+    try:
+        return await cancel_on_disconnect(http_request, coro)
+    except LLMTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except ClientDisconnected:
+        raise HTTPException(status_code=499, detail="Client closed request")
 
 @app.get("/")
 def read_root():
     return {"message": "Sentinel AI Auditor Online", "status": "active"}
 
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus text exposition of the counters and histograms in metrics.py."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/api/audit")
-async def audit_target(request: AuditRequest):
+async def audit_target(request: AuditRequest, http_request: Request, stream: bool = False):
     """
     Audits a given target (Address or Transaction) using Gemini.
+    With ?stream=true the progress and model tokens are sent as server-sent events.
     """
+    if stream:
+        return sse_response(audit_events(request, stream_tokens=True))
+    return await run_request(http_request, _audit(request))
+
+async def _audit(request: AuditRequest):
     try:
-        bytecode_context = ""
-        
-        if not request.type:
-             # Heuristic fallback if type is empty/unknown
-             request.type = "address"
+        # Identical audits already in flight (e.g. a freshly launched token) share one fetch and model call.
+        key = f"{AUDIT_PROMPT_VERSION}:{target_key(request.target)}"
+        # The flight never runs on a background job's model-call budget, whoever starts it.
+        return await audit_flights.do(key, lambda: final_result(audit_events(request)), context=uncharged_context())
+    except LLMTimeout:
+        raise
+    except Exception as e:
+        print(f"Error: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def pre_audit(address):
+    """Audits freshly published code so the verdict is cached before anyone asks.
+
+    Runs outside audit_flights so its model calls stay on the indexer's budget and
+    user audits of the same address never wait on it.
+    """
+    module_cache.invalidate(address)
+    await final_result(audit_events(AuditRequest(target=address, type="address")))
+
+async def audit_events(request: AuditRequest, stream_tokens=False):
+    """The audit pipeline as a sequence of (event, data) steps, ending with ("result", verdict)."""
+    # The declared type is no longer trusted: the resolver decides from the target's shape,
+    # racing both lookups when a 32-byte hex string could be either.
+    start = time.perf_counter()
+    try:
+        resolved = await resolve_target(module_cache, client, request.target)
+    except Exception as e:
+        record_fetch("unresolved", start)
+        print(f"Target resolution failed ({request.target}): {e}")
+        # Don't crash 500, return a 404-like analysis
+        yield "result", {
+            "status": "Unknown", 
+            "reason": f"Could not find code for target. Is it a valid address or hash? (Error: {str(e)})", 
+            "risk_score": 0
+        }
+        return
+
+    record_fetch(resolved.kind, start)
+    declared = "none"
+    if request.type:
+        declared = "match" if request.type == resolved.kind else "mismatch"
+    if declared == "mismatch":
+        print(f"Target declared as {request.type} resolved as {resolved.kind}")
+    metrics.TARGET_RESOLUTIONS.inc(shape=classify_target(request.target), kind=resolved.kind, declared=declared)
+    yield "resolved", {"target": resolved.target, "kind": resolved.kind}
+
+    async for event, data in analyze_events(resolved, stream_tokens):
+        if event == "result":
+            data["target_type"] = resolved.kind
+        yield event, data
+
+async def analyze_events(resolved, stream_tokens=False):
+    screen = None
+    if resolved.kind == "address":
+        abis = [m['abi'] for m in resolved.data if 'abi' in m]
+        yield "modules", {"count": len(resolved.data)}
+        if not abis:
+            yield "result", {"status": "Safe", "reason": "No executable code found to analyze.", "risk_score": 0}
+            return
+    elif not resolved.data:
+        yield "result", {"status": "Safe", "reason": "No executable code found to analyze.", "risk_score": 0}
+        return
 
-        # Attempts to fetch code/info with a fallback mechanism
+    if resolved.kind == "address":
+        # Deterministic rules first; obvious cases never reach the model.
+        with metrics.timed("prescreen"):
+            screen = prescreen(abis)
+        yield "prescreen", screen
+        if screen["verdict"]:
+            result = {
+                "status": screen["verdict"],
+                "risk_score": screen["score"],
+                "reason": format_findings(screen["findings"]) or "Static pre-screen: no callable entry points and no risky patterns.",
+                "findings": screen["findings"],
+                "source": "prescreen",
+            }
+            await audit_history.record_package(resolved.target, result, "prescreen")
+            yield "result", result
+            return
+
+    # AI Analysis
+    if not GEMINI_KEYS:
+        # Fallback if Key Missing logic - but we want Real.
+        yield "result", {
+            "status": "Safe", 
+            "risk_score": 5, 
+            "reason": "DEMO MODE: Gemini Key Missing. No real analysis performed."
+        }
+        return
+
+    cache_key = f"audit:{AUDIT_PROMPT_VERSION}:{resolved.fingerprint}"
+    cached = await audit_cache.get(cache_key)
+    metrics.CACHE_REQUESTS.inc(cache="audit", result="miss" if cached is None else "hit")
+    if cached is not None:
+        yield "result", dict(cached)
+        return
+
+    omitted = []
+    known = {}
+    reach = []
+    with metrics.timed("context"):
+        if resolved.kind == "address":
+            # What each entry function actually calls, read from the bytecode (memoized per module hash).
+            package_calls = analyze_package(resolved.data)
+            reach = package_calls["reach"]
+            # Modules whose bytecode was already judged keep their stored verdict; only the rest go to the model.
+            # What a module's entry functions reach depends on its callees too, so that is part of its hash.
+            hashes = {m['abi']['name']: reach_hash(module_hash(m), m['abi']['name'], reach) for m in resolved.data if 'abi' in m}
+            known = await audit_history.known_modules(resolved.target, hashes, AUDIT_PROMPT_VERSION)
+            changed = [abi for abi in abis if abi['name'] not in known]
+            # Compact ABI text, riskiest modules first, split to fit the per-call token budget.
+            chunks, omitted = build_chunks(changed, screen["findings"]) if changed else ([], [])
+        else:
+            # Payload, signers, gas, balance deltas and write summary instead of the raw JSON.
+            digest = digest_transaction(resolved.data)
+            chunks = [json.dumps(digest)]
+    if resolved.kind == "transaction":
+        yield "digest", digest
+    else:
+        yield "callgraph", {
+            "modules": package_calls["modules"],
+            "unparsed": package_calls["unparsed"],
+            "unguarded": [r for r in reach if not r["signer_checked"]],
+        }
+    if known:
+        yield "history", {"reused_modules": sorted(known), "changed_modules": [abi['name'] for abi in changed]}
+
+    chunk_verdicts = {}
+    if len(chunks) == 1:
+        text = ""
+        async for event, data in model_events(audit_prompt(chunks[0], screen, reach=reach), stream_tokens, "audit"):
+            if event == "text":
+                text = data
+            else:
+                yield event, data
+        verdict = parse_model_json(text, "audit")
+        if verdict is None:
+            yield "result", {"status": "Unknown", "reason": text, "risk_score": 50}
+            return
+        chunk_verdicts[0] = verdict
+    elif chunks:
+        # Map: one model call per chunk, in parallel. Reduce: the riskiest module decides.
+        yield "chunks", {"count": len(chunks), "omitted_modules": omitted}
+        calls = [
+            asyncio.ensure_future(audit_chunk(index, audit_prompt(chunk, screen, part=(index + 1, len(chunks)), reach=reach)))
+            for index, chunk in enumerate(chunks)
+        ]
         try:
-            # TRY 1: As Address (Modules)
-            if request.type == "address":
-                modules = await client.account_modules(request.target)
-                extracts = []
-                for module in modules:
-                    if 'abi' in module:
-                        extracts.append(str(module['abi']))
-                bytecode_context = "\n".join(extracts)
-            
-            # TRY 2: As Transaction (Tx Hash)
-            elif request.type == "transaction":
-                tx = await client.transaction_by_hash(request.target)
-                bytecode_context = str(tx)
-        
-        except Exception as first_error:
-            # If the first attempt failed, try the OTHER type just in case the frontend guessed wrong.
-            print(f"Primary fetch failed ({request.type}): {first_error}. Retrying as alternate...")
-            try:
-                if request.type == "address":
-                    # Retry as transaction
-                    tx = await client.transaction_by_hash(request.target)
-                    bytecode_context = str(tx)
-                    print("Retry success: It was a transaction.")
-                else: 
-                    # Retry as address
-                    modules = await client.account_modules(request.target)
-                    extracts = []
-                    for module in modules:
-                        if 'abi' in module:
-                            extracts.append(str(module['abi']))
-                    bytecode_context = "\n".join(extracts)
-                    print("Retry success: It was an address.")
-            except Exception as second_error:
-                # If both fail, then it really is bad.
-                print(f"Double failure. Giving up. {second_error}")
-                # Don't crash 500, return a 404-like analysis
-                return {
-                    "status": "Unknown", 
-                    "reason": f"Could not find code for target. Is it a valid address or hash? (Error: {str(first_error)})", 
-                    "risk_score": 0
-                }
-
-        if not bytecode_context:
-            return {"status": "Safe", "reason": "No executable code found to analyze.", "risk_score": 0}
-
-        # AI Analysis
-        if GEMINI_KEYS:
-            model = genai.GenerativeModel('gemini-1.5-pro')
-            prompt = f"""
-            You are a Smart Contract Auditor for the Aptos Blockchain.
-            Analyze the following Move Language context (ABI/Transaction) for security risks.
-            Look specifically for:
-            1. Rug-pull mechanisms (unauthorized withdrawals).
-            2. Infinite mint loops.
-            3. Suspicious logic.
-
-            Context:
-            {bytecode_context[:10000]} # Truncate to avoid limits
-
-            Response Format (JSON):
-            {{
-                "status": "Safe" | "Risky",
-                "risk_score": 0-100,
-                "reason": "Brief explanation..."
-            }}
-            """
-            response = generate_safe(prompt)
-            if not response:
-                 raise Exception("AI Generation Failed")
-            # Clean up response text to ensure JSON
-            text = response.text.replace("```json", "").replace("```", "").strip()
-            # Attempt to parse or return raw if failed? simpler to just return raw text if we rely on frontend parsing, but let's try to be clean.
-            # actually our frontend expects JSON object, so we should rely on Gemini returning valid JSON or handle it.
-            # sending text for now, frontend displays JSON.
-            import json
+            for next_done in asyncio.as_completed(calls):
+                index, verdict = await next_done
+                yield "chunk", {"index": index, "verdict": verdict}
+                if verdict is not None:
+                    chunk_verdicts[index] = verdict
+        finally:
+            for call in calls:
+                call.cancel()
+
+    unanalyzed = []
+    if resolved.kind == "address":
+        fresh = {}
+        for index, verdict in chunk_verdicts.items():
+            fresh.update(split_verdict(verdict, chunk_modules(chunks[index])))
+        # Chunks whose reply could not be parsed leave their modules without any verdict.
+        unanalyzed = [name for index, chunk in enumerate(chunks) if index not in chunk_verdicts for name in chunk_modules(chunk)]
+        await audit_history.record_modules(
+            resolved.target,
+            [dict(verdict, name=name, bytecode_hash=hashes[name]) for name, verdict in fresh.items()],
+            AUDIT_PROMPT_VERSION,
+        )
+        module_verdicts = dict(known, **fresh)
+        result = package_verdict(module_verdicts)
+        if result is not None:
+            if unanalyzed:
+                result["unanalyzed_modules"] = unanalyzed
+                if result["status"] == "Safe":
+                    # The rest of the package was never looked at; a clean subset proves nothing.
+                    result["status"] = "Unknown"
+            result["modules"] = [{"name": name, **verdict, "reused": name in known} for name, verdict in sorted(module_verdicts.items())]
+            await audit_history.record_package(
+                resolved.target, result, "model" if fresh else "history", audited=len(fresh), reused=len(known)
+            )
+    else:
+        result = chunk_verdicts.get(0)
+    if result is None:
+        yield "result", {"status": "Unknown", "reason": "AI Parsing Failed for every part of the package.", "risk_score": 50}
+        return
+
+    if omitted:
+        result["omitted_modules"] = omitted
+    # Only cache verdicts the model actually produced in the expected shape, for every part.
+    if not unanalyzed:
+        await audit_cache.set(cache_key, result)
+    yield "result", dict(result)
+
+async def audit_chunk(index, prompt):
+    record_prompt("audit", prompt)
+    with metrics.timed("llm"):
+        response = await generate_safe(prompt)
+    if not response:
+        raise Exception("AI Generation Failed")
+    return index, parse_model_json(response.text, "audit")
+
+def audit_prompt(context, screen, part=None, reach=()):
+    scope = ""
+    if part:
+        scope = f"This is part {part[0]} of {part[1]} of a larger package; judge only the modules shown."
+    return f"""
+    You are a Smart Contract Auditor for the Aptos Blockchain.
+    Analyze the following Move Language context (ABI/Transaction) for security risks.
+    ABIs are listed one module per block: structs with their abilities, then exposed
+    functions (visibility, entry flag, generics, parameter and return types).
+    Transactions are given as a JSON digest: payload, signers and fee payer, gas,
+    net balance change per account and asset, resource writes counted by type,
+    sensitive writes (code, capabilities, ownership) and event counts.
+    {scope}
+    Look specifically for:
+    1. Rug-pull mechanisms (unauthorized withdrawals).
+    2. Infinite mint loops.
+    3. Suspicious logic.
+
+    Context:
+    {context}
+    {screen_hint(screen, context)}
+    {call_hint(reach, context)}
+
+    Response Format (JSON):
+    {{
+        "status": "Safe" | "Risky",
+        "risk_score": 0-100,
+        "reason": "Brief explanation...",
+        "modules": [
+            {{"name": "module_name", "status": "Safe" | "Risky", "risk_score": 0-100, "reason": "..."}}
+        ]
+    }}
+    List every module shown under "modules".
+    """
+
+async def model_events(prompt, stream_tokens, endpoint):
+    """Runs the model, yielding ("token", ...) pieces when streaming and finally ("text", full_text)."""
+    record_prompt(endpoint, prompt)
+    start = time.perf_counter()
+    if stream_tokens:
+        pieces = []
+        async for piece in generate_stream(prompt):
+            pieces.append(piece)
+            yield "token", {"text": piece}
+        if not pieces:
+            raise Exception("AI Generation Failed")
+        text = "".join(pieces)
+    else:
+        response = await generate_safe(prompt)
+        if not response:
+             raise Exception("AI Generation Failed")
+        text = response.text
+    elapsed = time.perf_counter() - start
+    metrics.STAGE_SECONDS.observe(elapsed, endpoint=endpoint, stage="llm")
+    metrics.add_timing("llm", elapsed)
+    yield "text", text
+
+def record_prompt(endpoint, prompt):
+    metrics.PROMPT_CHARS.observe(len(prompt), endpoint=endpoint)
+    metrics.PROMPT_TOKENS.observe(estimate_tokens(prompt), endpoint=endpoint)
+
+def record_fetch(kind, start):
+    elapsed = time.perf_counter() - start
+    metrics.FETCH_SECONDS.observe(elapsed, kind=kind)
+    metrics.add_timing("fetch", elapsed)
+
+def parse_model_json(text, endpoint):
+    """Strips markdown fences from a model reply; returns the JSON object or None."""
+    text = text.replace("```json", "").replace("```", "").strip()
+    try:
+        result = json.loads(text)
+    except ValueError:
+        result = None
+    if not isinstance(result, dict):
+        metrics.PARSE_FAILURES.inc(endpoint=endpoint)
+        return None
+    return result
+
+async def final_result(events):
+    async for event, data in events:
+        if event == "result":
+            return data
+
+def sse_response(events):
+    """Streams (event, data) steps as server-sent events; failures become an `error` event."""
+    async def stream():
+        try:
+            async for event, data in events:
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        except Exception as e:
+            print(f"Stream Error: {e}")
+            yield f"event: error\ndata: {json.dumps({'detail': str(e)})}\n\n"
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.get("/api/history/risky")
+async def risky_modules(limit: int = 50):
+    """The most recently audited modules judged Risky."""
+    return {"modules": await audit_history.latest_risky(limit)}
+
+@app.get("/api/history/{address}")
+async def address_history(address: str, limit: int = 50):
+    """Past package audits and per-module verdicts for an address."""
+    if classify_target(address) is None:
+        raise HTTPException(status_code=400, detail="Not an account address")
+    return await audit_history.address_history(normalize_address(address), limit)
+
+@app.post("/api/audit/batch")
+async def audit_batch(request: AuditBatchRequest):
+    """
+    Audits many targets at once, streaming one NDJSON line per target as soon as it finishes.
+    Shares the audit cache and the LLM concurrency limit with /api/audit.
+    """
+    unique = {}
+    for item in request.targets:
+        unique.setdefault(target_key(item.target), item)
+    if len(unique) > BATCH_MAX_TARGETS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_TARGETS} distinct targets per batch")
+
+    fan_out = asyncio.Semaphore(BATCH_MAX_CONCURRENCY)
+
+    async def run_one(item):
+        async with fan_out:
             try:
-                return json.loads(text)
-            except:
-                return {"status": "Unknown", "reason": text, "risk_score": 50}
-        else:
-            # Fallback if Key Missing logic - but we want Real.
-             return {
-                "status": "Safe", 
-                "risk_score": 5, 
-                "reason": "DEMO MODE: Gemini Key Missing. No real analysis performed."
-            }
+                return {"target": item.target, "result": await _audit(item)}
+            except HTTPException as e:
+                return {"target": item.target, "error": e.detail}
+            except Exception as e:
+                return {"target": item.target, "error": str(e)}
 
-    except Exception as e:
-        print(f"Error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    async def stream():
+        tasks = [asyncio.ensure_future(run_one(item)) for item in unique.values()]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield json.dumps(await next_done) + "\n"
+        finally:
+            # Client went away mid-stream: stop the remaining audits.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+def target_key(target):
+    """Dedup key: spellings of the same address collapse, hashes compare case-insensitively."""
+    if classify_target(target) == "address":
+        return normalize_address(target)
+    return target.strip().lower()
 
 @app.post("/api/simulate")
-async def simulate_transaction(request: SimulationRequest):
+async def simulate_transaction(request: SimulationRequest, http_request: Request, stream: bool = False, mode: str = "node"):
     """
-    Simulates a transaction using AI prediction since we don't have user keys on backend.
+    Simulates a transaction on the fullnode (mode=node, the default) and has Gemini explain the
+    result, or only asks Gemini to predict the outcome (mode=predict).
+    With ?stream=true the progress and model tokens are sent as server-sent events.
     """
-    try:
-        # Fetch the module code to understand what the function does
-        module_addr = request.function_id.split("::")[0]
-        # function_name = request.function_id.split("::")[2] 
-        
-        modules = await client.account_modules(module_addr)
-        # Find the specific module ABI
-        abi_context = "Module not found"
-        for module in modules:
-            # Crude match
-            if module['abi']['name'] == request.function_id.split("::")[1]:
-                abi_context = str(module['abi'])
-                break
-        
-        if GEMINI_KEYS:
-             model = genai.GenerativeModel('gemini-1.5-pro')
-             prompt = f"""
-             Predict the outcome of this Aptos Transaction Simulation.
-             Function: {request.function_id}
-             Args: {request.args}
-             Type Args: {request.type_args}
-             Sender: {request.sender}
-             
-             Module ABI:
-             {abi_context}
-             
-             Predict:
-             1. Will it succeed?
-             2. What state changes might occur?
-             3. Any security warnings?
-             
-             Response Format (JSON):
-             {{
-                 "simulation_result": "Success" | "Failure",
-                 "gas_used": "Estimate (e.g. 2000)",
-                 "status": "Predicted Status",
-                 "changes": ["List of likely changes"],
-                 "analysis": "Brief explanation"
-             }}
-             """
-             response = generate_safe(prompt)
-             if not response:
-                 raise Exception("AI Generation Failed")
-             text = response.text.replace("```json", "").replace("```", "").strip()
-             import json
-             try:
-                 return json.loads(text)
-             except:
-                  return {
-                    "simulation_result": "Unknown", 
-                    "status": "AI Parsing Failed",
-                    "changes": ["Unknown"],
-                    "analysis": text
-                }
-        else:
-             return {
-                "simulation_result": "Success", 
-                "gas_used": 1500, 
-                "status": "Executed successfully (Mock)",
-                "changes": ["CoinStore modified", "Vault updated"]
-            }
+    if mode not in ("node", "predict"):
+        raise HTTPException(status_code=400, detail="mode must be 'node' or 'predict'")
+    if stream:
+        return sse_response(simulate_events(request, stream_tokens=True, mode=mode))
+    return await run_request(http_request, _simulate(request, mode))
+
+async def _simulate(request: SimulationRequest, mode="node"):
+    from aptos_sdk.async_client import ApiError
+    from simulation import SimulationError
 
+    try:
+        return await final_result(simulate_events(request, mode=mode))
+    except LLMTimeout:
+        raise
+    except SimulationError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except ApiError as e:
+        print(f"Simulate Error: {e}")
+        raise HTTPException(status_code=502, detail=f"Fullnode error: {e}")
     except Exception as e:
         print(f"Simulate Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def simulate_events(request: SimulationRequest, stream_tokens=False, mode="node"):
+    from aptos_sdk.async_client import ApiError
+    from simulation import SimulationError, build_payload, describe_changes, simulate
+
+    parts = request.function_id.split("::")
+    if len(parts) != 3 or not all(parts):
+        raise SimulationError("function_id must look like address::module::function")
+    module_addr, module_name, function_name = parts
+    # Only the target module is fetched (or taken from an already cached listing).
+    module = None
+    start = time.perf_counter()
+    try:
+        module = await module_cache.get_module(module_addr, module_name)
+    except ApiError as e:
+        if e.status_code != 404:
+            raise
+    finally:
+        record_fetch("module", start)
+    yield "module", {"module": f"{module_addr}::{module_name}", "found": module is not None}
+
+    if mode == "predict":
+        async for event, data in predict_events(request, str(module['abi']) if module else "Module not found", stream_tokens):
+            yield event, data
+        return
+
+    if module is None:
+        raise SimulationError(f"Module {module_addr}::{module_name} not found")
+    # Arity and argument types are checked against the ABI before anything is sent to the node.
+    payload = build_payload(module['abi'], function_name, request.type_args, request.args)
+    with metrics.timed("simulate", endpoint="simulate"):
+        tx = await simulate(client, request.sender, payload)
+    result = {
+        "simulation_result": "Success" if tx.get("success") else "Failure",
+        "gas_used": tx.get("gas_used"),
+        "status": tx.get("vm_status"),
+        "changes": describe_changes(tx.get("changes", [])),
+        "events": [event.get("type") for event in tx.get("events", [])],
+        "source": "fullnode",
+    }
+    yield "simulated", dict(result)
+
+    if not GEMINI_KEYS:
+        result["analysis"] = "Gemini key missing: no explanation generated."
+        yield "result", result
+        return
+
+    prompt = f"""
+    Explain the result of this Aptos transaction simulation to the user who is about to sign it.
+    Function: {request.function_id}
+    Args: {request.args}
+    Type Args: {request.type_args}
+    Sender: {request.sender}
+
+    Outcome: {result['simulation_result']} ({result['status']}), gas used {result['gas_used']}
+    State changes:
+    {chr(10).join(result['changes']) or 'none'}
+    Events: {', '.join(result['events']) or 'none'}
+
+    Point out anything that moves funds or permissions unexpectedly.
+
+    Response Format (JSON):
+    {{
+        "analysis": "Brief explanation",
+        "warnings": ["Security warnings, if any"]
+    }}
+    """
+    text = ""
+    async for event, data in model_events(prompt, stream_tokens, "simulate"):
+        if event == "text":
+            text = data
+        else:
+            yield event, data
+
+    explanation = parse_model_json(text, "simulate")
+    if explanation is None:
+        result["analysis"] = text
+    else:
+        result["analysis"] = explanation.get("analysis", "")
+        result["warnings"] = explanation.get("warnings", [])
+    yield "result", result
+
+async def predict_events(request: SimulationRequest, abi_context, stream_tokens):
+    """Asks Gemini to guess the outcome without running the transaction."""
+    if not GEMINI_KEYS:
+        yield "result", {
+            "simulation_result": "Success", 
+            "gas_used": 1500, 
+            "status": "Executed successfully (Mock)",
+            "changes": ["CoinStore modified", "Vault updated"]
+        }
+        return
+
+    prompt = f"""
+    Predict the outcome of this Aptos Transaction Simulation.
+    Function: {request.function_id}
+    Args: {request.args}
+    Type Args: {request.type_args}
+    Sender: {request.sender}
+    
+    Module ABI:
+    {abi_context}
+    
+    Predict:
+    1. Will it succeed?
+    2. What state changes might occur?
+    3. Any security warnings?
+    
+    Response Format (JSON):
+    {{
+        "simulation_result": "Success" | "Failure",
+        "gas_used": "Estimate (e.g. 2000)",
+        "status": "Predicted Status",
+        "changes": ["List of likely changes"],
+        "analysis": "Brief explanation"
+    }}
+    """
+    text = ""
+    async for event, data in model_events(prompt, stream_tokens, "simulate"):
+        if event == "text":
+            text = data
+        else:
+            yield event, data
+
+    result = parse_model_json(text, "simulate")
+    if result is None:
+        yield "result", {
+            "simulation_result": "Unknown", 
+            "status": "AI Parsing Failed",
+            "changes": ["Unknown"],
+            "analysis": text
+        }
+        return
+    yield "result", dict(result, source="prediction")
+
 if __name__ == "__main__":
     uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
@@ -0,0 +1,155 @@
+import time
+import contextvars
+from contextlib import contextmanager
+
+# Minimal Prometheus-style counters and histograms, rendered in the text exposition
+# format on /metrics, plus per-request stage timings for the Server-Timing header.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+SIZE_BUCKETS = (250, 500, 1000, 2500, 5000, 10000, 25000, 50000, 100000)
+
+REGISTRY = []
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{str(v)}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Counter:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.values = {}  # label values -> [bucket counts..., sum, count]
+        REGISTRY.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labels)
+        state = self.values.get(key)
+        if state is None:
+            state = self.values[key] = [0] * len(self.buckets) + [0.0, 0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[i] += 1
+        state[-2] += value
+        state[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        names = self.labels + ("le",)
+        for key, state in sorted(self.values.items()):
+            for bound, count in zip(self.buckets, state):
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (bound,))} {count}")
+            lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {state[-1]}")
+            lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {state[-2]}")
+            lines.append(f"{self.name}_count{_label_text(self.labels, key)} {state[-1]}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name, help_text, labels=()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values = {}
+        REGISTRY.append(self)
+
+    def set(self, value, **labels):
+        self.values[tuple(labels.get(n, "") for n in self.labels)] = value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_label_text(self.labels, key)} {value}")
+        return lines
+
+
+def render():
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+REQUEST_SECONDS = Histogram("sentinel_request_seconds", "HTTP request latency", ["path", "status"])
+STAGE_SECONDS = Histogram("sentinel_stage_seconds", "Time spent per pipeline stage", ["endpoint", "stage"])
+FETCH_SECONDS = Histogram("sentinel_fetch_seconds", "Fullnode fetch latency by resolved target type", ["kind"])
+TARGET_RESOLUTIONS = Counter(
+    "sentinel_target_resolutions_total", "Resolved targets by input shape, result and declared type", ["shape", "kind", "declared"]
+)
+TARGET_LOOKUP_FAILURES = Counter(
+    "sentinel_target_lookup_failures_total",
+    "Lookups that lost an ambiguous-target race by failing or finding an empty account",
+    ["lookup", "reason"],
+)
+PROMPT_CHARS = Histogram("sentinel_prompt_chars", "Prompt size in characters", ["endpoint"], SIZE_BUCKETS)
+PROMPT_TOKENS = Histogram("sentinel_prompt_tokens", "Estimated prompt size in tokens", ["endpoint"], SIZE_BUCKETS)
+LLM_SECONDS = Histogram("sentinel_llm_seconds", "Gemini call latency per key", ["key"])
+LLM_CALLS = Counter("sentinel_llm_calls_total", "Gemini calls per key and outcome", ["key", "outcome"])
+CACHE_REQUESTS = Counter("sentinel_cache_requests_total", "Cache lookups", ["cache", "result"])
+INDEXER_PUBLISHES = Counter("sentinel_indexer_publishes_total", "Module publishes seen by the chain indexer", ["kind"])
+INDEXER_AUDITS = Counter("sentinel_indexer_audits_total", "Background pre-audits by outcome", ["outcome"])
+INDEXER_VERSION = Gauge("sentinel_indexer_checkpoint_version", "Last ledger version the indexer fully processed")
+INDEXER_QUEUE = Gauge("sentinel_indexer_queue_depth", "Addresses waiting for a background pre-audit")
+PARSE_FAILURES = Counter("sentinel_parse_failures_total", "Model replies that were not a JSON object", ["endpoint"])
+
+
+# ======================== Server-Timing ========================
+
+_timings = contextvars.ContextVar("server_timings", default=None)
+
+
+def begin_request():
+    """Starts collecting stage timings for the current request; returns the list they land in."""
+    timings = []
+    _timings.set(timings)
+    return timings
+
+
+def add_timing(name, seconds):
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((name, seconds))
+
+
+@contextmanager
+def timed(stage, endpoint="audit"):
+    """Records a pipeline stage in sentinel_stage_seconds and the request's Server-Timing."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_SECONDS.observe(elapsed, endpoint=endpoint, stage=stage)
+        add_timing(stage, elapsed)
+
+
+def server_timing(timings):
+    """Server-Timing header value; a repeated stage (parallel LLM chunks) reports its slowest run."""
+    totals = {}
+    for name, seconds in timings:
+        totals[name] = max(totals.get(name, 0.0), seconds)
+    return ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in totals.items())
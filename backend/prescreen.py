@@ -0,0 +1,170 @@
+import re
+
+SEVERITY_WEIGHTS = {"info": 0, "low": 10, "medium": 25, "high": 45}
+
+# Types that let their holder mint, burn, freeze or act as an account/object.
+CAPABILITY_TYPES = (
+    "::coin::MintCapability",
+    "::coin::BurnCapability",
+    "::coin::FreezeCapability",
+    "::fungible_asset::MintRef",
+    "::fungible_asset::BurnRef",
+    "::fungible_asset::TransferRef",
+    "::account::SignerCapability",
+    "::object::ExtendRef",
+)
+# Types that hold value on behalf of the module.
+ASSET_TYPES = ("::coin::Coin<", "::fungible_asset::FungibleAsset", "::fungible_asset::FungibleStore")
+
+# Coins and fungible assets passed around by value (an Object<FungibleStore> is only a handle).
+VALUE_TYPE = re.compile(r"^0x0*1::(coin::Coin<|fungible_asset::FungibleAsset$)")
+# `&MintCapability<T>`, `&ConstructorRef`, `&mut AdminCap`: only whoever holds one can make the call.
+GUARD_PARAM = re.compile(r"^&(mut )?0x[0-9a-fA-F]+::\w+::\w*(Capability|Cap|Ref)(<|$)")
+ZERO_NAME = re.compile(r"(^|_)zero($|_)")
+
+VALUE_MOVING_NAME = re.compile(r"withdraw|mint|drain|sweep|payout|claim|extract|rescue|emergency|burn", re.I)
+
+# Above this (with at least one high finding) the model is not consulted.
+RISKY_THRESHOLD = 45
+
+
+def _is_capability(type_str):
+    return any(cap in type_str for cap in CAPABILITY_TYPES)
+
+
+def _is_asset(type_str):
+    return any(asset in type_str for asset in ASSET_TYPES)
+
+
+def _takes_signer(fn):
+    return any(p in ("&signer", "signer") for p in fn.get("params", []))
+
+
+def _takes_asset(fn):
+    return any(_is_asset(p) for p in fn.get("params", []))
+
+
+def _is_guarded(fn):
+    """Needs a signer, or a reference to a capability/ref that only its holder can produce."""
+    return _takes_signer(fn) or any(GUARD_PARAM.match(p) for p in fn.get("params", []))
+
+
+def _is_zero_constructor(fn, returns_value):
+    # coin::zero<T>(): Coin<T> and friends hand out an empty value, not module funds.
+    generic_only = not fn.get("params") and all(re.search(r"<T\d+>$", t) for t in returns_value)
+    return bool(ZERO_NAME.search(fn["name"])) or generic_only
+
+
+def _finding(module, item, severity, rule, detail):
+    return {"module": module, "item": item, "severity": severity, "rule": rule, "detail": detail}
+
+
+def screen_module(abi):
+    """Applies every rule to one module ABI and returns its findings."""
+    name = f"{abi.get('address', '?')}::{abi.get('name', '?')}"
+    functions = abi.get("exposed_functions", [])
+    structs = abi.get("structs", [])
+    findings = []
+
+    holds_assets = False
+    holds_caps = False
+    for struct in structs:
+        abilities = set(struct.get("abilities", []))
+        for field in struct.get("fields", []):
+            field_type = field.get("type", "")
+            is_cap = _is_capability(field_type) or ("::" in field_type and field.get("name", "").endswith("_cap"))
+            holds_assets = holds_assets or _is_asset(field_type)
+            holds_caps = holds_caps or is_cap
+            if not is_cap:
+                continue
+            where = f"{struct['name']}.{field['name']}"
+            if "copy" in abilities:
+                findings.append(_finding(name, where, "high", "copyable-capability",
+                                         f"capability {field_type} lives in a struct with `copy`, so it can be duplicated"))
+            elif "store" in abilities:
+                findings.append(_finding(name, where, "low", "storable-capability",
+                                         f"capability {field_type} lives in a struct with `store` and can leave the module"))
+            else:
+                findings.append(_finding(name, where, "info", "held-capability",
+                                         f"capability {field_type} is held in a key-only resource"))
+
+    for fn in functions:
+        where = fn["name"]
+        visibility = fn.get("visibility")
+        returns = fn.get("return", [])
+        returns_cap = [t for t in returns if _is_capability(t)]
+        returns_value = [t for t in returns if VALUE_TYPE.match(t)]
+        signer = _takes_signer(fn)
+
+        # Hints for the model only: what a capability, signer or value is worth depends on the body.
+        # Public functions are callable from scripts and any other module, not just via entry points.
+        if visibility in ("public", "friend") and not _is_guarded(fn):
+            severity = "medium" if visibility == "public" else "low"
+            if returns_cap:
+                rule = "capability-leak" if visibility == "public" else "friend-capability-leak"
+                findings.append(_finding(name, where, severity, rule,
+                                         f"{visibility} function hands out {returns_cap[0]} without a signer or capability"))
+            if "signer" in returns:
+                findings.append(_finding(name, where, severity, "signer-leak",
+                                         f"{visibility} function returns a signer without a signer or capability"))
+            if returns_value and not _takes_asset(fn) and not _is_zero_constructor(fn, returns_value):
+                findings.append(_finding(name, where, severity, "asset-leak",
+                                         f"{visibility} function returns {returns_value[0]} without a signer, "
+                                         "capability or asset in exchange"))
+
+        if not fn.get("is_entry") or fn.get("is_view"):
+            continue
+        value_moving = bool(VALUE_MOVING_NAME.search(where))
+        if value_moving and not signer and (holds_assets or holds_caps):
+            findings.append(_finding(name, where, "high", "unsigned-value-entry",
+                                     "entry function that can move module-held value is callable without a signer"))
+        elif value_moving and signer and holds_assets:
+            findings.append(_finding(name, where, "medium", "signer-value-entry",
+                                     "signer entry function may pay out from module-held coins"))
+        elif value_moving and signer and holds_caps:
+            findings.append(_finding(name, where, "medium", "signer-capability-entry",
+                                     "signer entry function may exercise a stored mint/burn/signer capability"))
+
+    own_address = abi.get("address", "")
+    external = [f for f in abi.get("friends", []) if not f.startswith(own_address + "::")]
+    has_friend_fns = any(fn.get("visibility") == "friend" for fn in functions)
+    if external and has_friend_fns:
+        findings.append(_finding(name, "friends", "medium", "external-friend",
+                                 f"friend functions are callable from other addresses: {', '.join(external)}"))
+
+    return findings
+
+
+def prescreen(abis):
+    """Screens a package (list of module ABIs).
+
+    Returns {"score", "verdict", "findings"} where verdict is "Safe" or "Risky"
+    when the rules alone are conclusive and None when the model should decide.
+    """
+    findings = []
+    has_callable = False
+    for abi in abis:
+        findings.extend(screen_module(abi))
+        for fn in abi.get("exposed_functions", []):
+            if not fn.get("is_view") and (fn.get("is_entry") or fn.get("visibility") == "public"):
+                has_callable = True
+
+    score = min(100, sum(SEVERITY_WEIGHTS[f["severity"]] for f in findings))
+    worst = max((SEVERITY_WEIGHTS[f["severity"]] for f in findings), default=0)
+
+    verdict = None
+    if worst >= SEVERITY_WEIGHTS["high"] and score >= RISKY_THRESHOLD:
+        verdict = "Risky"
+    elif worst == 0 and not has_callable:
+        # Nothing but views can be called from a transaction, a script or another module, and no rule fired.
+        verdict = "Safe"
+
+    return {"score": score, "verdict": verdict, "findings": findings}
+
+
+def format_findings(findings, limit=20):
+    """One line per finding, for the audit response and the model hint."""
+    lines = [f"[{f['severity']}] {f['module']}::{f['item']}: {f['detail']}" for f in findings[:limit]]
+    if len(findings) > limit:
+        lines.append(f"... {len(findings) - limit} more")
+    return "\n".join(lines)
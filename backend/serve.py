@@ -0,0 +1,49 @@
+import os
+import argparse
+
+import uvicorn
+
+# Production launcher: several uvicorn worker processes sharing their caches and
+# Gemini quota through local SQLite files.
+#
+#   python serve.py --workers 8 --port 8000
+#
+# `python main.py` stays the single-process, auto-reloading dev server.
+
+
+def parse_args(argv=None):
+    p = argparse.ArgumentParser(description="Run the Sentinel AI backend with multiple workers")
+    p.add_argument("--host", default=os.getenv("SENTINEL_HOST", "0.0.0.0"))
+    p.add_argument("--port", type=int, default=int(os.getenv("SENTINEL_PORT", "8000")))
+    p.add_argument("--workers", type=int, default=int(os.getenv("SENTINEL_WORKERS", str(os.cpu_count() or 1))))
+    p.add_argument("--state-dir", default=os.getenv("SENTINEL_STATE_DIR", "."),
+                   help="where the shared SQLite files live")
+    return p.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    os.makedirs(args.state_dir, exist_ok=True)
+    # Workers inherit these, so every process reads and writes the same stores.
+    # Explicit settings (including empty ones) win.
+    shared = {
+        "AUDIT_CACHE_PATH": "audit_cache.db",
+        "AUDIT_HISTORY_PATH": "audit_history.db",
+        "GEMINI_QUOTA_PATH": "gemini_quota.db",
+        "INDEXER_CHECKPOINT_PATH": "indexer_checkpoint.json",
+    }
+    for name, filename in shared.items():
+        os.environ.setdefault(name, os.path.join(args.state_dir, filename))
+
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        timeout_keep_alive=30,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+import json
+
+from aptos_sdk.account_address import AccountAddress
+from aptos_sdk.authenticator import AccountAuthenticator
+from aptos_sdk.bcs import Serializer
+from aptos_sdk.transactions import EntryFunction, SignedTransaction, TransactionArgument, TransactionPayload
+from aptos_sdk.type_tag import StructTag, TypeTag
+
+from chain import normalize_address
+
+# Builds entry-function payloads from the module ABI and runs them through the
+# fullnode's simulate endpoint, so gas and write sets are real rather than guessed.
+
+INTEGER_BITS = {"u8": 8, "u16": 16, "u32": 32, "u64": 64, "u128": 128, "u256": 256}
+TYPE_TAG_VARIANTS = {
+    "bool": TypeTag.BOOL, "u8": TypeTag.U8, "u16": TypeTag.U16, "u32": TypeTag.U32, "u64": TypeTag.U64,
+    "u128": TypeTag.U128, "u256": TypeTag.U256, "address": TypeTag.ACCOUNT_ADDRESS, "signer": TypeTag.SIGNER,
+}
+SIGNER_PARAMS = ("signer", "&signer")
+
+
+class SimulationError(ValueError):
+    """The request does not match the entry function's ABI"""
+
+
+class NoAccountAuthenticator(AccountAuthenticator):
+    """AccountAuthenticator::NoAccountAuthenticator: simulate as a sender whose key we do not hold."""
+
+    NO_ACCOUNT_AUTHENTICATOR = 4
+
+    def __init__(self):
+        self.variant = self.NO_ACCOUNT_AUTHENTICATOR
+        self.authenticator = None
+
+    def serialize(self, serializer):
+        serializer.uleb128(self.variant)
+
+
+class _Tag:
+    """Type tag without a value (the SDK's primitive tags also serialize one)."""
+
+    def __init__(self, variant, inner=None):
+        self._variant = variant
+        self.inner = inner
+
+    def variant(self):
+        return self._variant
+
+    def __eq__(self, other):
+        return isinstance(other, _Tag) and (self._variant, self.inner) == (other._variant, other.inner)
+
+    def __str__(self):
+        names = {v: k for k, v in TYPE_TAG_VARIANTS.items()}
+        return f"vector<{self.inner}>" if self._variant == TypeTag.VECTOR else names[self._variant]
+
+    def serialize(self, serializer):
+        if self.inner is not None:
+            self.inner.serialize(serializer)
+
+
+def split_generic(type_str):
+    """"0x1::coin::Coin<0x1::aptos_coin::AptosCoin>" -> ("0x1::coin::Coin", ["0x1::aptos_coin::AptosCoin"])."""
+    type_str = type_str.strip()
+    if not type_str.endswith(">") or "<" not in type_str:
+        return type_str, []
+    base, inner = type_str.split("<", 1)
+    args, depth, current = [], 0, ""
+    for c in inner[:-1]:
+        if c == "," and depth == 0:
+            args.append(current.strip())
+            current = ""
+            continue
+        depth += (c == "<") - (c == ">")
+        current += c
+    args.append(current.strip())
+    return base.strip(), args
+
+
+def parse_type_tag(type_str):
+    base, args = split_generic(type_str)
+    if base in TYPE_TAG_VARIANTS:
+        if args:
+            raise SimulationError(f"'{type_str}' takes no type arguments")
+        return TypeTag(_Tag(TYPE_TAG_VARIANTS[base]))
+    if base == "vector":
+        if len(args) != 1:
+            raise SimulationError(f"'{type_str}' needs exactly one element type")
+        return TypeTag(_Tag(TypeTag.VECTOR, parse_type_tag(args[0])))
+    parts = base.split("::")
+    if len(parts) != 3 or not all(parts):
+        raise SimulationError(f"'{type_str}' is not a type (expected address::module::Name)")
+    try:
+        address = AccountAddress.from_str_relaxed(parts[0])
+    except Exception:
+        raise SimulationError(f"'{parts[0]}' in '{type_str}' is not an address")
+    return TypeTag(StructTag(address, parts[1], parts[2], [parse_type_tag(a) for a in args]))
+
+
+def _is_framework_struct(base, module, name):
+    parts = base.split("::")
+    return len(parts) == 3 and parts[1:] == [module, name] and normalize_address(parts[0]) == "0x1"
+
+
+def _kind(type_str):
+    """What an argument of this type looks like on the wire, plus its element type if any."""
+    base, args = split_generic(type_str)
+    if base in INTEGER_BITS or base == "bool":
+        return base, None
+    if base == "address" or _is_framework_struct(base, "object", "Object"):
+        return "address", None
+    if _is_framework_struct(base, "string", "String"):
+        return "string", None
+    if base == "vector" and len(args) == 1:
+        return "vector", args[0]
+    if _is_framework_struct(base, "option", "Option") and len(args) == 1:
+        return "option", args[0]
+    raise SimulationError(f"Arguments of type {type_str} cannot be passed to an entry function")
+
+
+def encoder_for(type_str):
+    kind, inner = _kind(type_str)
+    if kind in ("vector", "option"):
+        # BCS encodes an Option as a vector of zero or one element.
+        return Serializer.sequence_serializer(encoder_for(inner))
+    return {"bool": Serializer.bool, "address": Serializer.struct, "string": Serializer.str}.get(kind) or getattr(Serializer, kind)
+
+
+def parse_value(type_str, raw):
+    """Python value for one argument given as text (JSON arrays for vectors and options)."""
+    kind, inner = _kind(type_str)
+    text = raw if isinstance(raw, str) else json.dumps(raw)
+    if kind in INTEGER_BITS:
+        try:
+            value = int(text, 0) if isinstance(raw, str) else int(raw)
+        except (TypeError, ValueError):
+            raise SimulationError(f"'{text}' is not a {kind}")
+        if not 0 <= value < 2 ** INTEGER_BITS[kind]:
+            raise SimulationError(f"{value} is out of range for {kind}")
+        return value
+    if kind == "bool":
+        if text.lower() not in ("true", "false"):
+            raise SimulationError(f"'{text}' is not a bool")
+        return text.lower() == "true"
+    if kind == "address":
+        try:
+            return AccountAddress.from_str_relaxed(text)
+        except Exception:
+            raise SimulationError(f"'{text}' is not an address")
+    if kind == "string":
+        return text
+
+    if kind == "vector" and inner == "u8" and isinstance(raw, str) and raw.startswith("0x"):
+        try:
+            return list(bytes.fromhex(raw[2:]))
+        except ValueError:
+            raise SimulationError(f"'{raw}' is not hex bytes")
+    items = raw
+    if isinstance(raw, str):
+        try:
+            items = json.loads(raw) if raw.strip() else []
+        except ValueError:
+            raise SimulationError(f"'{raw}' is not a JSON array for {type_str}")
+    if kind == "option" and not isinstance(items, list):
+        items = [] if items is None else [items]
+    if not isinstance(items, list):
+        raise SimulationError(f"'{text}' is not a JSON array for {type_str}")
+    if kind == "option" and len(items) > 1:
+        raise SimulationError(f"{type_str} holds at most one value")
+    return [parse_value(inner, item) for item in items]
+
+
+def entry_function(abi, name):
+    for fn in abi.get("exposed_functions", []):
+        if fn["name"] == name:
+            if not fn.get("is_entry"):
+                raise SimulationError(f"{abi['name']}::{name} is not an entry function")
+            return fn
+    raise SimulationError(f"{abi['name']} has no function {name}")
+
+
+def build_payload(abi, function_name, type_args, args):
+    """Checks type_args/args against the ABI and returns the entry-function payload."""
+    fn = entry_function(abi, function_name)
+    params = list(fn.get("params", []))
+    signers = 0
+    while signers < len(params) and params[signers] in SIGNER_PARAMS:
+        signers += 1
+    if signers > 1:
+        raise SimulationError(f"{function_name} needs {signers} signers; only single-signer calls can be simulated")
+    params = params[signers:]
+
+    expected_generics = len(fn.get("generic_type_params", []))
+    if len(type_args) != expected_generics:
+        raise SimulationError(f"{function_name} takes {expected_generics} type arguments, got {len(type_args)}")
+    if len(args) != len(params):
+        raise SimulationError(f"{function_name} takes {len(params)} arguments ({', '.join(params)}), got {len(args)}")
+
+    tags = [parse_type_tag(t) for t in type_args]
+    arguments = []
+    for index, (param, raw) in enumerate(zip(params, args)):
+        if param.startswith("T") and param[1:].isdigit():
+            raise SimulationError(f"Argument {index} has generic type {param}, which entry functions cannot take")
+        arguments.append(TransactionArgument(parse_value(param, raw), encoder_for(param)))
+    # ModuleId.from_str wants the canonical spelling (0x1, or all 64 hex digits).
+    module_id = f"{AccountAddress.from_str_relaxed(abi['address'])}::{abi['name']}"
+    return TransactionPayload(EntryFunction.natural(module_id, function_name, tags, arguments))
+
+
+async def simulate(client, sender, payload):
+    """Runs payload through /transactions/simulate as sender; returns the simulated transaction."""
+    try:
+        sender_address = AccountAddress.from_str_relaxed(sender)
+    except Exception:
+        raise SimulationError(f"'{sender}' is not an address")
+    raw = await client.create_bcs_transaction(sender_address, payload)
+    result = await client.simulate_bcs_transaction(SignedTransaction(raw, NoAccountAuthenticator()), estimate_gas_usage=True)
+    return result[0] if isinstance(result, list) else result
+
+
+def describe_changes(changes, limit=20):
+    """One line per write-set change, e.g. "write_resource 0xa11ce::0x1::coin::CoinStore<...>"."""
+    lines = []
+    for change in changes[:limit]:
+        kind = change.get("type", "change")
+        data = change.get("data") or {}
+        what = data.get("type") or change.get("module") or change.get("resource") or change.get("handle") or ""
+        lines.append(f"{kind} {change.get('address', '')} {what}".strip())
+    if len(changes) > limit:
+        lines.append(f"... {len(changes) - limit} more changes")
+    return lines
@@ -0,0 +1,406 @@
+import json
+import time
+import random
+import socket
+import asyncio
+import hashlib
+
+import grpc
+import uvicorn
+import google.ai.generativelanguage as glm
+from aptos_sdk.bcs import Deserializer
+from aptos_sdk.transactions import RawTransaction
+from fastapi import FastAPI, HTTPException, Request
+
+# Local stand-ins for the Aptos fullnode REST API and the Gemini gRPC API, so the
+# backend can be exercised and benchmarked with no network (see bench.py).
+
+
+class Behaviour:
+    """Latency and failure knobs shared by both stand-ins."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, quota_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.quota_rate = quota_rate
+        self.random = random.Random(seed)
+
+    async def delay(self):
+        ms = self.latency_ms + self.random.uniform(0, self.jitter_ms)
+        if ms > 0:
+            await asyncio.sleep(ms / 1000)
+
+    def fails(self):
+        return self.random.random() < self.error_rate
+
+    def over_quota(self):
+        return self.random.random() < self.quota_rate
+
+
+class Stats:
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.quota_errors = 0
+        self.busy_seconds = 0.0
+        self.by_route = {}
+
+    def record(self, route, seconds):
+        self.requests += 1
+        self.busy_seconds += seconds
+        self.by_route[route] = self.by_route.get(route, 0) + 1
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "quota_errors": self.quota_errors,
+            "mean_ms": round(1000 * self.busy_seconds / self.requests, 2) if self.requests else 0.0,
+            "by_route": dict(self.by_route),
+        }
+
+
+def free_socket():
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    return sock
+
+
+# ======================== Chain fixtures ========================
+
+def _hex(rng, n_bytes):
+    return "0x" + "".join(f"{rng.randrange(256):02x}" for _ in range(n_bytes))
+
+
+def make_module(address, name, rng, functions=12, bytecode_bytes=2048):
+    """A synthetic module in the shape the fullnode returns, ABI included."""
+    exposed = []
+    for i in range(functions):
+        kind = i % 4
+        exposed.append({
+            "name": ["withdraw", "deposit", "balance", "configure"][kind] + f"_{i}",
+            "visibility": "friend" if kind == 3 else "public",
+            "is_entry": kind in (0, 1),
+            "is_view": kind == 2,
+            "generic_type_params": [{"constraints": []}] if kind == 0 else [],
+            "params": ["&signer", "u64"] if kind != 2 else ["address"],
+            "return": ["u64"] if kind == 2 else [],
+        })
+    structs = [
+        {"name": "Vault", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "balance", "type": "0x1::coin::Coin<0x1::aptos_coin::AptosCoin>"}]},
+        {"name": "Config", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "admin", "type": "address"}, {"name": "fee_bps", "type": "u64"}]},
+    ]
+    return {
+        "bytecode": _hex(rng, bytecode_bytes),
+        "abi": {"address": address, "name": name, "friends": [], "exposed_functions": exposed, "structs": structs},
+    }
+
+
+def make_transaction(tx_hash, sender, rng, events=8):
+    return {
+        "type": "user_transaction",
+        "version": str(rng.randrange(10**9)),
+        "hash": tx_hash,
+        "success": True,
+        "vm_status": "Executed successfully",
+        "sender": sender,
+        "sequence_number": str(rng.randrange(1000)),
+        "gas_used": str(rng.randrange(10, 2000)),
+        "gas_unit_price": "100",
+        "max_gas_amount": "200000",
+        "payload": {
+            "type": "entry_function_payload",
+            "function": "0x1::coin::transfer",
+            "type_arguments": ["0x1::aptos_coin::AptosCoin"],
+            "arguments": [sender, str(rng.randrange(10**8))],
+        },
+        "events": [
+            {"type": "0x1::coin::WithdrawEvent", "guid": {"account_address": sender, "creation_number": "3"},
+             "sequence_number": str(i), "data": {"amount": str(rng.randrange(10**6))}}
+            for i in range(events)
+        ],
+        "changes": [],
+        "signature": {"type": "ed25519_signature", "public_key": _hex(rng, 32), "signature": _hex(rng, 64)},
+    }
+
+
+class ChainFixtures:
+    """Deterministic accounts, modules and transactions served by the fullnode stand-in."""
+
+    def __init__(self, accounts=50, modules_per_account=3, framework_modules=80, transactions=50, seed=0):
+        rng = random.Random(seed)
+        self.modules = {"0x1": [make_module("0x1", f"framework_{i}", rng) for i in range(framework_modules)]}
+        self.addresses = []
+        for i in range(accounts):
+            address = f"0x{0xa11ce000 + i:x}"
+            self.addresses.append(address)
+            self.modules[address] = [make_module(address, f"mod_{j}", rng) for j in range(modules_per_account)]
+        self.transactions = {}
+        for i in range(transactions):
+            tx_hash = "0x" + hashlib.sha256(f"tx-{seed}-{i}".encode()).hexdigest()
+            tx = make_transaction(tx_hash, rng.choice(self.addresses), rng)
+            tx["version"] = str(1000 + i)
+            if i % 5 == 4:
+                # Every fifth transaction (re)publishes the sender's package, for the chain indexer.
+                tx["payload"] = {"type": "entry_function_payload", "function": "0x1::code::publish_package_txn",
+                                 "type_arguments": [], "arguments": []}
+                tx["changes"] = [{"type": "write_module", "address": tx["sender"], "data": module}
+                                 for module in self.modules[tx["sender"]]]
+            self.transactions[tx_hash] = tx
+        self.hashes = list(self.transactions)
+        self.upgrades = {}  # address -> PackageRegistry upgrade_number, bumped by tests
+
+
+def _normalize(address):
+    raw = address.lower()
+    raw = raw[2:] if raw.startswith("0x") else raw
+    return "0x" + (raw.lstrip("0") or "0")
+
+
+def fullnode_app(fixtures, behaviour, stats):
+    """FastAPI app implementing the handful of fullnode routes the backend calls."""
+    app = FastAPI()
+
+    async def serve(route, produce):
+        start = time.perf_counter()
+        try:
+            await behaviour.delay()
+            if behaviour.fails():
+                stats.errors += 1
+                raise HTTPException(status_code=500, detail="stand-in failure")
+            return produce()
+        finally:
+            stats.record(route, time.perf_counter() - start)
+
+    def modules_of(address):
+        modules = fixtures.modules.get(_normalize(address))
+        if modules is None:
+            raise HTTPException(status_code=404, detail="account_not_found")
+        return modules
+
+    @app.get("/v1")
+    async def info():
+        return await serve("info", lambda: {"chain_id": 4, "ledger_version": "1000", "node_role": "full_node"})
+
+    @app.get("/v1/accounts/{address}")
+    async def account(address: str):
+        def produce():
+            modules_of(address)  # 404 for unknown accounts
+            return {"sequence_number": "0", "authentication_key": address}
+        return await serve("account", produce)
+
+    @app.get("/v1/accounts/{address}/resource/{resource_type}")
+    async def account_resource(address: str, resource_type: str):
+        def produce():
+            if resource_type != "0x1::code::PackageRegistry":
+                raise HTTPException(status_code=404, detail="resource_not_found")
+            modules_of(address)
+            upgrades = fixtures.upgrades.get(_normalize(address), 0)
+            return {"type": resource_type, "data": {"packages": [{"name": "package", "upgrade_number": str(upgrades)}]}}
+        return await serve("account_resource", produce)
+
+    @app.get("/v1/accounts/{address}/modules")
+    async def account_modules(address: str):
+        return await serve("account_modules", lambda: modules_of(address))
+
+    @app.get("/v1/accounts/{address}/module/{name}")
+    async def account_module(address: str, name: str):
+        def produce():
+            for module in modules_of(address):
+                if module["abi"]["name"] == name:
+                    return module
+            raise HTTPException(status_code=404, detail="module_not_found")
+        return await serve("account_module", produce)
+
+    @app.get("/v1/transactions/by_hash/{tx_hash}")
+    async def transaction_by_hash(tx_hash: str):
+        def produce():
+            tx = fixtures.transactions.get(tx_hash.lower())
+            if tx is None:
+                raise HTTPException(status_code=404, detail="transaction_not_found")
+            return tx
+        return await serve("transaction_by_hash", produce)
+
+    @app.post("/v1/transactions/simulate")
+    async def simulate(request: Request):
+        body = await request.body()
+
+        def produce():
+            # Parses the BCS the way the node would: raw transaction, then SingleSender(NoAccountAuthenticator).
+            deserializer = Deserializer(body)
+            try:
+                raw = RawTransaction.deserialize(deserializer)
+                authenticator = deserializer._read(deserializer.remaining())
+            except Exception as e:
+                raise HTTPException(status_code=400, detail=f"invalid_transaction: {e}")
+            if authenticator != bytes([4, 4]):
+                raise HTTPException(status_code=400, detail="invalid_signature")
+            entry = raw.payload.value
+            sender = _normalize(str(raw.sender))
+            module_address = _normalize(str(entry.module.address))
+            fn = None
+            for module in fixtures.modules.get(module_address, []):
+                if module["abi"]["name"] == entry.module.name:
+                    fn = next((f for f in module["abi"]["exposed_functions"] if f["name"] == entry.function), None)
+            status = "Executed successfully"
+            if fn is None:
+                status = "FUNCTION_RESOLUTION_FAILURE"
+            elif len(entry.args) != len([p for p in fn["params"] if p not in ("signer", "&signer")]):
+                status = "NUMBER_OF_ARGUMENTS_MISMATCH"
+            success = status == "Executed successfully"
+            store = "0x1::coin::CoinStore<0x1::aptos_coin::AptosCoin>"
+            return [{
+                "type": "user_transaction",
+                "version": "0",
+                "hash": "0x" + hashlib.sha256(body).hexdigest(),
+                "success": success,
+                "vm_status": status,
+                "sender": sender,
+                "sequence_number": str(raw.sequence_number),
+                "gas_used": str(6 + 4 * len(entry.args)) if success else "3",
+                "gas_unit_price": str(raw.gas_unit_price),
+                "max_gas_amount": str(raw.max_gas_amount),
+                "payload": {"type": "entry_function_payload", "function": f"{module_address}::{entry.module.name}::{entry.function}",
+                            "type_arguments": [str(t) for t in entry.ty_args], "arguments": ["0x" + a.hex() for a in entry.args]},
+                "events": [{"type": "0x1::transaction_fee::FeeStatement", "data": {}}],
+                "changes": [{"type": "write_resource", "address": sender, "data": {"type": store, "data": {}}}] if success else [],
+            }]
+        return await serve("simulate", produce)
+
+    @app.get("/v1/transactions")
+    async def transactions(limit: int = 25, start: int = None):
+        def produce():
+            ordered = sorted(fixtures.transactions.values(), key=lambda tx: int(tx["version"]))
+            if start is None:
+                return ordered[-limit:]
+            return [tx for tx in ordered if int(tx["version"]) >= start][:limit]
+        return await serve("transactions", produce)
+
+    return app
+
+
+# ======================== Gemini stand-in ========================
+
+AUDIT_REPLY = {"status": "Safe", "risk_score": 12, "reason": "Stand-in verdict: no rug-pull paths in the shown ABI."}
+SIMULATION_REPLY = {
+    "simulation_result": "Success",
+    "gas_used": "1500",
+    "status": "Predicted Status",
+    "changes": ["CoinStore modified"],
+    "analysis": "Stand-in prediction.",
+}
+
+EXPLANATION_REPLY = {"analysis": "Stand-in explanation of the simulated write set.", "warnings": []}
+
+SERVICE_NAME = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+
+def _reply_text(request):
+    prompt = " ".join(part.text for content in request.contents for part in content.parts)
+    if "Predict the outcome" in prompt:
+        reply = SIMULATION_REPLY
+    elif "Explain the result" in prompt:
+        reply = EXPLANATION_REPLY
+    else:
+        reply = AUDIT_REPLY
+    return "```json\n" + json.dumps(reply) + "\n```"
+
+
+def _response(text):
+    return glm.GenerateContentResponse(
+        candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)], role="model"), finish_reason=1)]
+    )
+
+
+class GeminiStandIn:
+    """Plaintext gRPC server answering GenerateContent / StreamGenerateContent with canned JSON."""
+
+    def __init__(self, behaviour, stats, chunk_chars=24):
+        self.behaviour = behaviour
+        self.stats = stats
+        self.chunk_chars = chunk_chars
+        self.keys_seen = {}
+        self.server = None
+        self.port = None
+
+    async def _check(self, context):
+        key = dict(context.invocation_metadata()).get("x-goog-api-key", "")
+        self.keys_seen[key] = self.keys_seen.get(key, 0) + 1
+        await self.behaviour.delay()
+        if self.behaviour.over_quota():
+            self.stats.quota_errors += 1
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED, "429 Quota exceeded (stand-in)")
+        if self.behaviour.fails():
+            self.stats.errors += 1
+            await context.abort(grpc.StatusCode.INTERNAL, "stand-in failure")
+
+    async def generate(self, request, context):
+        start = time.perf_counter()
+        try:
+            await self._check(context)
+            return _response(_reply_text(request))
+        finally:
+            self.stats.record("generate", time.perf_counter() - start)
+
+    async def stream_generate(self, request, context):
+        start = time.perf_counter()
+        try:
+            await self._check(context)
+            text = _reply_text(request)
+            for i in range(0, len(text), self.chunk_chars):
+                yield _response(text[i:i + self.chunk_chars])
+        finally:
+            self.stats.record("stream_generate", time.perf_counter() - start)
+
+    async def start(self):
+        handler = grpc.method_handlers_generic_handler(
+            SERVICE_NAME,
+            {
+                "GenerateContent": grpc.unary_unary_rpc_method_handler(
+                    self.generate,
+                    request_deserializer=glm.GenerateContentRequest.deserialize,
+                    response_serializer=glm.GenerateContentResponse.serialize,
+                ),
+                "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                    self.stream_generate,
+                    request_deserializer=glm.GenerateContentRequest.deserialize,
+                    response_serializer=glm.GenerateContentResponse.serialize,
+                ),
+            },
+        )
+        self.server = grpc.aio.server()
+        self.server.add_generic_rpc_handlers((handler,))
+        self.port = self.server.add_insecure_port("127.0.0.1:0")
+        await self.server.start()
+        return f"127.0.0.1:{self.port}"
+
+    async def stop(self):
+        if self.server:
+            await self.server.stop(grace=None)
+
+
+class HttpServer:
+    """Runs an ASGI app with uvicorn on a free local port inside the current event loop."""
+
+    def __init__(self, app):
+        self.sock = free_socket()
+        self.port = self.sock.getsockname()[1]
+        self.server = uvicorn.Server(uvicorn.Config(app, log_level="warning", lifespan="on"))
+        self.task = None
+
+    async def start(self):
+        self.task = asyncio.ensure_future(self.server.serve(sockets=[self.sock]))
+        while not self.server.started:
+            if self.task.done():
+                self.task.result()
+            await asyncio.sleep(0.01)
+        return f"http://127.0.0.1:{self.port}"
+
+    async def stop(self):
+        self.server.should_exit = True
+        if self.task:
+            await self.task
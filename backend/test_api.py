@@ -0,0 +1,317 @@
+import os
+import re
+import json
+import asyncio
+
+os.environ.setdefault("AUDIT_CACHE_PATH", "")
+os.environ.setdefault("AUDIT_HISTORY_PATH", "")
+
+import llm
+import main
+from chain import ResolvedTarget
+from context import format_module
+from history import AuditHistory
+
+TX_HASH = "0x" + "ab" * 32
+
+
+def transaction(tx_hash=TX_HASH):
+    return {"type": "user_transaction", "hash": tx_hash, "sender": "0xa11ce", "success": True,
+            "payload": {"type": "entry_function_payload", "function": "0xcafe::vault::drain",
+                        "type_arguments": [], "arguments": []}}
+
+
+async def call_app(method, path, body=None, disconnect_after=None):
+    """Drives main.app over raw ASGI; the client can go away after disconnect_after seconds."""
+    messages, sent = asyncio.Queue(), []
+    await messages.put({"type": "http.request", "body": json.dumps(body).encode() if body else b"", "more_body": False})
+    if disconnect_after is not None:
+        asyncio.get_running_loop().call_later(disconnect_after, messages.put_nowait, {"type": "http.disconnect"})
+
+    async def receive():
+        return await messages.get()
+
+    async def send(message):
+        sent.append(message)
+
+    path, _, query = path.partition("?")
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": method, "scheme": "http",
+        "path": path, "raw_path": path.encode(), "query_string": query.encode(), "root_path": "",
+        "headers": [(b"content-type", b"application/json")], "client": ("127.0.0.1", 1), "server": ("test", 80),
+    }
+    await main.app(scope, receive, send)
+    return sent
+
+
+def test_server_timing_header():
+    sent = asyncio.run(call_app("GET", "/"))
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    assert start["status"] == 200
+    assert dict(start["headers"])[b"server-timing"].startswith(b"total;dur=")
+
+
+def test_disconnected_audit_cancels_its_model_call(monkeypatch):
+    calls = []
+
+    async def slow_model(prompt):
+        calls.append("started")
+        try:
+            await asyncio.sleep(3)
+        except asyncio.CancelledError:
+            calls.append("cancelled")
+            raise
+
+    async def resolve(module_cache, client, target):
+        return ResolvedTarget("transaction", target, transaction(target))
+
+    monkeypatch.setattr(main, "GEMINI_KEYS", ["test-key"])
+    monkeypatch.setattr(main, "generate_safe", slow_model)
+    monkeypatch.setattr(main, "resolve_target", resolve)
+    monkeypatch.setattr(main, "DISCONNECT_POLL_SECONDS", 0.05)
+
+    async def run():
+        await asyncio.wait_for(
+            call_app("POST", "/api/audit", {"target": TX_HASH, "type": "transaction"}, disconnect_after=0.3), 2
+        )
+        await asyncio.sleep(0)  # let the cancelled model call unwind
+
+    asyncio.run(run())
+    assert calls == ["started", "cancelled"]
+
+
+def test_background_budget_never_throttles_joined_user_audits(monkeypatch):
+    class Exhausted:
+        async def acquire(self):
+            await asyncio.Event().wait()
+
+    class Reply:
+        text = '{"status": "Safe", "risk_score": 1, "reason": "ok"}'
+
+    class Slot:
+        in_flight = 1
+
+    async def start(prompt, deadline):
+        return Slot(), Reply()
+
+    async def resolve(module_cache, client, target):
+        await asyncio.sleep(0.05)
+        return ResolvedTarget("transaction", target, transaction(target))
+
+    monkeypatch.setattr(main, "GEMINI_KEYS", ["test-key"])
+    # The real generate_safe, so the budget is checked; only the Gemini call itself is faked.
+    monkeypatch.setattr(llm, "GEMINI_KEYS", ["test-key"])
+    monkeypatch.setattr(llm, "_start", start)
+    monkeypatch.setattr(main, "resolve_target", resolve)
+    request = main.AuditRequest(target="0x" + "cd" * 32, type="transaction")
+
+    async def background():
+        llm.charge_to(Exhausted())  # e.g. the indexer, out of model calls for this minute
+        return await main._audit(request)
+
+    async def run():
+        first = asyncio.ensure_future(background())
+        await asyncio.sleep(0)
+        return await asyncio.wait_for(asyncio.gather(first, main._audit(request)), 2)
+
+    results = asyncio.run(run())
+    assert [r["status"] for r in results] == ["Safe", "Safe"]
+
+
+def package_abi(name):
+    return {"address": "0xcafe", "name": name, "friends": [], "structs": [], "exposed_functions": [
+        {"name": "drain", "visibility": "public", "is_entry": True, "is_view": False, "params": ["u64"], "return": []},
+    ]}
+
+
+SAFE_PACKAGE = '{"status": "Safe", "risk_score": 5, "reason": "ok", "modules": []}'
+
+
+def fake_package_audit(monkeypatch, package, reach, reply=SAFE_PACKAGE):
+    """Routes main's address audits to `package` and a model that records which modules it saw."""
+    seen = []
+
+    async def resolve(module_cache, client, target):
+        return ResolvedTarget("address", target, package)
+
+    async def model(prompt):
+        seen.append(re.findall(r"\bmodule 0xcafe::(\w+)", prompt))
+        class Reply:
+            text = reply
+        return Reply()
+
+    monkeypatch.setattr(main, "GEMINI_KEYS", ["test-key"])
+    monkeypatch.setattr(main, "generate_safe", model)
+    monkeypatch.setattr(main, "resolve_target", resolve)
+    monkeypatch.setattr(main, "analyze_package", lambda modules: {"modules": len(modules), "unparsed": [], "reach": reach})
+    return seen
+
+
+def test_unchanged_module_is_re_audited_when_its_reach_changes(monkeypatch):
+    monkeypatch.setattr(main, "audit_history", AuditHistory(""))
+    package = [{"bytecode": "0x01", "abi": package_abi("a")}, {"bytecode": "0x02", "abi": package_abi("b")}]
+    request = main.AuditRequest(target="0xcafe", type="address")
+
+    seen = fake_package_audit(monkeypatch, package, [])
+    asyncio.run(main._audit(request))
+    assert seen == [["a", "b"]]
+
+    # b is upgraded; a's bytes are unchanged but its entry function now reaches coin::extract through b.
+    package[1] = {"bytecode": "0x03", "abi": package_abi("b")}
+    seen = fake_package_audit(monkeypatch, package, [{
+        "entry": "0xcafe::a::drain", "sink": "0x1::coin::extract", "signer_checked": False,
+        "path": ["0xcafe::a::drain", "0xcafe::b::pay", "0x1::coin::extract"],
+    }])
+    asyncio.run(main._audit(request))
+    assert seen == [["a", "b"]]
+
+
+def test_concurrent_identical_audits_share_one_fetch_and_model_call(monkeypatch):
+    fetches, model_calls = [], []
+
+    async def resolve(module_cache, client, target):
+        fetches.append(target)
+        await asyncio.sleep(0.05)
+        return ResolvedTarget("transaction", target, transaction(target))
+
+    async def model(prompt):
+        model_calls.append(prompt)
+        class Reply:
+            text = '{"status": "Safe", "risk_score": 1, "reason": "ok"}'
+        return Reply()
+
+    monkeypatch.setattr(main, "audit_cache", main.AuditCache(path=""))
+    monkeypatch.setattr(main, "GEMINI_KEYS", ["test-key"])
+    monkeypatch.setattr(main, "generate_safe", model)
+    monkeypatch.setattr(main, "resolve_target", resolve)
+    request = main.AuditRequest(target="0x" + "ef" * 32, type="transaction")
+
+    async def run():
+        return await asyncio.gather(*(main._audit(request) for _ in range(8)))
+
+    results = asyncio.run(run())
+    assert len(fetches) == 1 and len(model_calls) == 1
+    assert [r["status"] for r in results] == ["Safe"] * 8
+
+
+def test_upgrade_re_audits_only_changed_modules_and_recomputes_the_package_verdict(monkeypatch):
+    monkeypatch.setattr(main, "audit_history", AuditHistory(""))
+    monkeypatch.setattr(main, "audit_cache", main.AuditCache(path=""))
+    package = [{"bytecode": "0x01", "abi": package_abi("a")}, {"bytecode": "0x02", "abi": package_abi("b")}]
+    request = main.AuditRequest(target="0xcafe", type="address")
+
+    seen = fake_package_audit(monkeypatch, package, [])
+    first = asyncio.run(main._audit(request))
+    assert seen == [["a", "b"]] and first["status"] == "Safe"
+
+    package[1] = {"bytecode": "0x03", "abi": package_abi("b")}
+    seen = fake_package_audit(monkeypatch, package, [], reply=json.dumps(
+        {"status": "Risky", "risk_score": 90, "reason": "drain", "modules": [{"name": "b", "status": "Risky", "risk_score": 90, "reason": "drain"}]}
+    ))
+    second = asyncio.run(main._audit(request))
+    assert seen == [["b"]]
+    # a's stored Safe verdict and b's fresh Risky one are merged; the riskiest decides.
+    assert (second["status"], second["risk_score"], second["reason"]) == ("Risky", 90, "b: drain")
+    assert {m["name"]: m["reused"] for m in second["modules"]} == {"a": True, "b": False}
+
+    audits = asyncio.run(main.audit_history.address_history("0xcafe"))["audits"]
+    assert sorted((a["modules_audited"], a["modules_reused"]) for a in audits) == [(1, 1), (2, 0)]
+
+
+def test_unparsable_chunk_is_reported_and_not_cached(monkeypatch):
+    monkeypatch.setattr(main, "audit_history", AuditHistory(""))
+    monkeypatch.setattr(main, "audit_cache", main.AuditCache(path=""))
+    package = [{"bytecode": f"0x0{i}", "abi": package_abi(f"m{i}")} for i in range(3)]
+    request = main.AuditRequest(target="0xcafe", type="address")
+    fake_package_audit(monkeypatch, package, [])
+    monkeypatch.setattr(main, "build_chunks", lambda abis, findings: ([format_module(abi) for abi in abis], []))
+
+    async def model(prompt):
+        class Reply:
+            text = "not json" if "module 0xcafe::m2" in prompt else SAFE_PACKAGE
+        return Reply()
+
+    monkeypatch.setattr(main, "generate_safe", model)
+    result = asyncio.run(main._audit(request))
+    assert result["status"] == "Unknown"
+    assert result["unanalyzed_modules"] == ["m2"]
+    assert [m["name"] for m in result["modules"]] == ["m0", "m1"]
+    assert len(main.audit_cache.entries) == 0
+
+
+def body_of(sent):
+    return b"".join(m.get("body", b"") for m in sent if m["type"] == "http.response.body")
+
+
+def test_batch_dedupes_streams_in_completion_order_and_reports_errors_per_item(monkeypatch):
+    audited = []
+    delays = {"0x1": 0.15, "0xcafe": 0.05}
+
+    async def audit(request):
+        audited.append(request.target)
+        await asyncio.sleep(delays.get(request.target, 0.1))
+        if request.target == "0xbad":
+            raise main.HTTPException(status_code=500, detail="node down")
+        return {"status": "Safe", "risk_score": 1, "reason": "ok"}
+
+    monkeypatch.setattr(main, "_audit", audit)
+    targets = ["0x1", "0x0001", "0X1", "0xbad", "0xcafe", "0x000cafe"]
+    sent = asyncio.run(call_app("POST", "/api/audit/batch", {"targets": [{"target": t, "type": "address"} for t in targets]}))
+    lines = [json.loads(line) for line in body_of(sent).splitlines()]
+
+    # Equivalent spellings collapse to the first one; each target is audited once.
+    assert sorted(audited) == ["0x1", "0xbad", "0xcafe"]
+    # Fastest first; the failing target gets its own error line without stopping the others.
+    assert [line["target"] for line in lines] == ["0xcafe", "0xbad", "0x1"]
+    assert lines[1] == {"target": "0xbad", "error": "node down"}
+    assert lines[2]["result"]["status"] == "Safe"
+
+
+def test_batch_rejects_too_many_distinct_targets(monkeypatch):
+    monkeypatch.setattr(main, "BATCH_MAX_TARGETS", 2)
+    body = {"targets": [{"target": t, "type": "address"} for t in ["0x1", "0x01", "0x2", "0x3"]]}
+    sent = asyncio.run(call_app("POST", "/api/audit/batch", body))
+    start = next(m for m in sent if m["type"] == "http.response.start")
+    assert start["status"] == 413
+
+    monkeypatch.setattr(main, "BATCH_MAX_TARGETS", 3)
+    monkeypatch.setattr(main, "_audit", lambda request: asyncio.sleep(0, {"status": "Safe"}))
+    sent = asyncio.run(call_app("POST", "/api/audit/batch", body))
+    assert len(body_of(sent).splitlines()) == 3
+
+
+def sse_events(sent):
+    """[(event, data)] from a server-sent event stream."""
+    frames = body_of(sent).decode().strip().split("\n\n")
+    return [(frame.split("\n")[0][len("event: "):], json.loads(frame.split("\n")[1][len("data: "):])) for frame in frames]
+
+
+def stream_package_audit(monkeypatch, pieces, fail=None):
+    monkeypatch.setattr(main, "audit_history", AuditHistory(""))
+    monkeypatch.setattr(main, "audit_cache", main.AuditCache(path=""))
+    fake_package_audit(monkeypatch, [{"bytecode": "0x0a", "abi": package_abi("stream")}], [])
+
+    async def generate_stream(prompt):
+        for piece in pieces:
+            await asyncio.sleep(0)
+            yield piece
+        if fail:
+            raise fail
+
+    monkeypatch.setattr(main, "generate_stream", generate_stream)
+    return sse_events(asyncio.run(call_app("POST", "/api/audit?stream=true", {"target": "0xcafe", "type": "address"})))
+
+
+def test_streamed_audit_sends_progress_then_tokens_then_the_result(monkeypatch):
+    events = stream_package_audit(monkeypatch, ['{"status": "Safe", ', '"risk_score": 3, "reason": "ok"}'])
+    names = [name for name, _ in events]
+    assert names[:3] == ["resolved", "modules", "prescreen"]
+    assert names[-3:] == ["token", "token", "result"]
+    assert "".join(data["text"] for name, data in events if name == "token").startswith('{"status": "Safe"')
+    assert events[-1][1]["status"] == "Safe" and events[-1][1]["risk_score"] == 3
+
+
+def test_streamed_audit_failure_becomes_an_error_event(monkeypatch):
+    events = stream_package_audit(monkeypatch, ['{"status": '], fail=RuntimeError("Gemini went away"))
+    assert [name for name, _ in events][-2:] == ["token", "error"]
+    assert events[-1][1] == {"detail": "Gemini went away"}
@@ -0,0 +1,9 @@
+from bench import percentile
+
+
+def test_percentile_is_nearest_rank():
+    hundred = list(range(1, 101))
+    assert (percentile(hundred, 50), percentile(hundred, 95), percentile(hundred, 99)) == (50, 95, 99)
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile([7.0], 99) == 7.0
+    assert percentile([], 50) == 0.0
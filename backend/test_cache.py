@@ -0,0 +1,96 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from cache import AuditCache, SingleFlight
+
+
+def test_single_flight_error_reaches_every_waiter():
+    runs = []
+
+    async def failing():
+        runs.append(1)
+        await asyncio.sleep(0.01)
+        raise ValueError("node down")
+
+    async def run():
+        flights = SingleFlight()
+        return await asyncio.gather(*(flights.do("k", failing) for _ in range(3)), return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert runs == [1]
+    assert [type(r) for r in results] == [ValueError] * 3
+
+
+def test_cancelling_one_waiter_leaves_the_others_their_result():
+    async def slow():
+        await asyncio.sleep(0.05)
+        return {"status": "Safe"}
+
+    async def run():
+        flights = SingleFlight()
+        first = asyncio.ensure_future(flights.do("k", slow))
+        second = asyncio.ensure_future(flights.do("k", slow))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second
+
+    assert asyncio.run(run()) == {"status": "Safe"}
+
+
+def test_shared_task_is_cancelled_once_every_waiter_left():
+    cancelled = []
+
+    async def slow():
+        try:
+            await asyncio.sleep(1)
+        except asyncio.CancelledError:
+            cancelled.append(True)
+            raise
+
+    async def run():
+        flights = SingleFlight()
+        waiters = [asyncio.ensure_future(flights.do("k", slow)) for _ in range(2)]
+        await asyncio.sleep(0.01)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.sleep(0)
+        return flights.flights
+
+    assert asyncio.run(run()) == {}
+    assert cancelled == [True]
+
+
+def test_disk_cache_waits_for_another_workers_lock_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "audit_cache.db")
+    cache = AuditCache(path=path)
+    other_worker = sqlite3.connect(path, isolation_level=None)
+
+    async def run():
+        other_worker.execute("BEGIN IMMEDIATE")
+        asyncio.get_running_loop().call_later(0.2, other_worker.execute, "COMMIT")
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        await cache.set("k", {"status": "Safe"})
+        ticking.cancel()
+        return ticks
+
+    try:
+        # The write blocks on the lock for ~0.2s while other requests keep being served.
+        assert asyncio.run(run()) >= 5
+        cache.entries.clear()
+        assert asyncio.run(cache.get("k")) == {"status": "Safe"}
+    finally:
+        cache.close()
+        other_worker.close()
@@ -0,0 +1,151 @@
+import time
+
+import pytest
+
+from callgraph import BytecodeError, CallGraph, analyze_package, parse_module, summarize
+
+# There is no Move compiler here, so modules are assembled directly in the binary
+# format (version 7), mirroring move/sources/insurance_vault.move.
+
+SIGNER_REF = bytes([0x06, 0x0C])  # &signer
+U64 = bytes([0x03])
+COIN = "0x1::coin::"
+
+
+def uleb(n):
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        out.append(byte | (0x80 if n else 0))
+        if not n:
+            return bytes(out)
+
+
+def vec(items):
+    return uleb(len(items)) + b"".join(items)
+
+
+def assemble(address, name, functions, version=7):
+    """functions: [(name, visibility, is_entry, [param tokens], [callee, ...])].
+
+    Callees are "0xaddr::module::fn", with a "generic " prefix for CallGeneric.
+    """
+    identifiers, addresses, modules, handles, signatures = [], [], [], [], []
+
+    def intern(table, item):
+        if item not in table:
+            table.append(item)
+        return table.index(item)
+
+    def module(addr, mod):
+        raw = int(addr, 16).to_bytes(32, "big")
+        return intern(modules, (intern(addresses, raw), intern(identifiers, mod)))
+
+    def handle(full_name, params=()):
+        addr, mod, fn = full_name.split("::")
+        sig = intern(signatures, vec(list(params)))
+        return intern(handles, (module(addr, mod), intern(identifiers, fn), sig))
+
+    module(address, name)
+    empty_sig = intern(signatures, vec([]))
+    instantiations, defs = [], []
+    own = {fn: handle(f"{address}::{name}::{fn}", params) for fn, _, _, params, _ in functions}
+    for fn, visibility, is_entry, params, callees in functions:
+        code = [bytes([0x06]) + (7).to_bytes(8, "little"), bytes([0x0A, 0]), bytes([0x01])]  # LdU64, CopyLoc, Pop
+        code.append(bytes([0x4A]) + bytes(32))  # LdU256
+        code.append(bytes([0x40]) + uleb(empty_sig) + (0).to_bytes(8, "little"))  # VecPack
+        for callee in callees:
+            if callee.startswith("generic "):
+                inst = intern(instantiations, handle(callee[len("generic "):]))
+                code.append(bytes([0x38]) + uleb(inst))
+            else:
+                code.append(bytes([0x11]) + uleb(handle(callee)))
+        code.append(bytes([0x02]))  # Ret
+        flags = 0x4 if is_entry else 0
+        defs.append(uleb(own[fn]) + bytes([visibility, flags]) + uleb(0) + uleb(empty_sig) + uleb(len(code)) + b"".join(code))
+
+    tables = [
+        (0x1, b"".join(uleb(a) + uleb(n) for a, n in modules)),
+        (0x3, b"".join(uleb(m) + uleb(n) + uleb(s) + uleb(empty_sig) + uleb(0) + (b"\x00" if version >= 7 else b"")
+                       for m, n, s in handles)),
+        (0x4, b"".join(uleb(h) + uleb(empty_sig) for h in instantiations)),
+        (0x5, b"".join(signatures)),
+        (0x7, b"".join(uleb(len(i)) + i.encode() for i in identifiers)),
+        (0x8, b"".join(addresses)),
+        (0xC, b"".join(defs)),
+    ]
+    header, content = bytearray(), bytearray()
+    for kind, body in tables:
+        header += bytes([kind]) + uleb(len(content)) + uleb(len(body))
+        content += body
+    return b"\xa1\x1c\xeb\x0b" + version.to_bytes(4, "little") + uleb(len(tables)) + header + content + uleb(0)
+
+
+INSURANCE_VAULT = assemble("0xcafe", "insurance_vault", [
+    ("init_module", 0, False, [SIGNER_REF], [f"generic {COIN}zero"]),
+    ("stake_for_insurance", 1, True, [SIGNER_REF, U64], [
+        "0x1::signer::address_of", f"generic {COIN}withdraw", f"generic {COIN}merge", "0x1::timestamp::now_seconds",
+    ]),
+    ("claim_payout", 0, True, [SIGNER_REF], [
+        "0x1::signer::address_of", "0x1::randomness::u64_range", f"generic {COIN}value",
+        f"generic {COIN}extract", f"generic {COIN}deposit",
+    ]),
+])
+# A second module of the same package whose entry function pays out through a helper, unsigned.
+LEAKY = assemble("0xcafe", "leaky", [("drain", 0, True, [U64], ["0xcafe::payouts::pay"])])
+PAYOUTS = assemble("0xcafe", "payouts", [("pay", 1, False, [U64], [f"generic {COIN}extract", f"{COIN}deposit"])])
+
+
+def test_decodes_functions_and_calls():
+    module = parse_module(INSURANCE_VAULT)
+    assert (module["address"], module["name"]) == ("0xcafe", "insurance_vault")
+    stake = module["functions"]["stake_for_insurance"]
+    assert stake["visibility"] == "public" and stake["is_entry"] and stake["takes_signer"]
+    assert stake["calls"] == ("0x1::signer::address_of", f"{COIN}withdraw", f"{COIN}merge", "0x1::timestamp::now_seconds")
+    assert not module["functions"]["init_module"]["is_entry"]
+    assert not parse_module(LEAKY)["functions"]["drain"]["takes_signer"]
+
+
+def test_cross_module_reachability_and_signer_checks():
+    graph = CallGraph([parse_module(m) for m in (INSURANCE_VAULT, LEAKY, PAYOUTS)])
+    reach = {(r["entry"], r["sink"]): r for r in graph.sensitive_reach("0xcafe")}
+    assert reach[("0xcafe::insurance_vault::claim_payout", f"{COIN}extract")]["signer_checked"]
+    assert reach[("0xcafe::insurance_vault::stake_for_insurance", f"{COIN}withdraw")]["signer_checked"]
+    drain = reach[("0xcafe::leaky::drain", f"{COIN}extract")]
+    assert not drain["signer_checked"]
+    assert drain["path"] == ["0xcafe::leaky::drain", "0xcafe::payouts::pay", f"{COIN}extract"]
+    assert len(reach) == 3
+
+
+def test_package_analysis_from_fullnode_modules():
+    modules = [{"bytecode": "0x" + m.hex(), "abi": {"name": n}}
+               for m, n in ((INSURANCE_VAULT, "insurance_vault"), (LEAKY, "leaky"), (PAYOUTS, "payouts"))]
+    modules.append({"bytecode": "0xdeadbeef", "abi": {"name": "garbage"}})
+    report = analyze_package(modules)
+    assert report["modules"] == 3 and report["unparsed"] == ["garbage"]
+    assert [r["entry"] for r in report["reach"] if not r["signer_checked"]] == ["0xcafe::leaky::drain"]
+    assert summarize("0x" + LEAKY.hex()) is summarize("0x" + LEAKY.hex())  # memoized per bytecode hash
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"\x00" * 16, "bad magic"),
+    (assemble("0x1", "m", [], version=4), "unsupported bytecode version"),
+    (INSURANCE_VAULT[:-40], "malformed|truncated|past the end"),
+])
+def test_rejects_what_it_cannot_read(data, message):
+    with pytest.raises(BytecodeError, match=message):
+        parse_module(data)
+
+
+def test_framework_sized_input_parses_quickly():
+    # Roughly the size of 0x1: ~130 modules, ~30 functions each.
+    callees = [f"{COIN}value", "0x1::signer::address_of", "generic 0x1::vector::length", f"generic {COIN}extract"] * 10
+    modules = [
+        assemble("0x1", f"m{i}", [(f"f{j}", 1, j % 5 == 0, [SIGNER_REF, U64], callees) for j in range(30)])
+        for i in range(130)
+    ]
+    start = time.perf_counter()
+    graph = CallGraph([parse_module(m) for m in modules])
+    graph.sensitive_reach()
+    assert time.perf_counter() - start < 1.0
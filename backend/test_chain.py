@@ -0,0 +1,142 @@
+import asyncio
+
+from aptos_sdk.async_client import RestClient
+
+from chain import ModuleCache, TargetNotFound, normalize_address, resolve_target
+from simulation import build_payload, describe_changes, simulate
+from standins import Behaviour, ChainFixtures, HttpServer, Stats, fullnode_app
+
+
+async def stand_in_node(fixtures):
+    stats = Stats()
+    node = HttpServer(fullnode_app(fixtures, Behaviour(), stats))
+    url = await node.start()
+    return node, RestClient(f"{url}/v1"), stats
+
+
+async def settle(cache):
+    """Waits for background revalidations to finish."""
+    await asyncio.sleep(0)
+    while cache.pending:
+        await asyncio.gather(*cache.pending.values(), return_exceptions=True)
+
+
+def test_module_cache_refetches_only_after_an_upgrade():
+    async def run():
+        fixtures = ChainFixtures(framework_modules=1, accounts=1, modules_per_account=2, transactions=0)
+        node, client, stats = await stand_in_node(fixtures)
+        cache = ModuleCache(client, ttl=0)
+        address = fixtures.addresses[0]
+        try:
+            await cache.get_modules(address)
+            await cache.get_modules(address)  # stale: revalidated, registry unchanged
+            await settle(cache)
+            assert stats.by_route["account_modules"] == 1
+
+            # Upgrade through a resource account or multisig: no sequence number change, only the registry moves.
+            fixtures.modules[address] = [dict(m, bytecode="0xfeed") for m in fixtures.modules[address]]
+            fixtures.upgrades[address] = 1
+            await cache.get_modules(address)
+            await settle(cache)
+            assert stats.by_route["account_modules"] == 2
+            return await cache.get_modules(address)
+        finally:
+            await client.close()
+            await node.stop()
+
+    modules = asyncio.run(run())
+    assert {m["bytecode"] for m in modules} == {"0xfeed"}
+
+
+def test_resolved_address_reuses_the_cached_fingerprint(monkeypatch):
+    import chain
+    from cache import fingerprint
+
+    async def run():
+        fixtures = ChainFixtures(framework_modules=1, accounts=1, modules_per_account=2, transactions=0)
+        node, client, stats = await stand_in_node(fixtures)
+        cache = ModuleCache(client)
+        try:
+            first = await resolve_target(cache, client, fixtures.addresses[0])
+            monkeypatch.setattr(chain, "fingerprint", lambda *parts: "recomputed")
+            second = await resolve_target(cache, client, fixtures.addresses[0])
+            return first, second
+        finally:
+            await client.close()
+            await node.stop()
+
+    first, second = asyncio.run(run())
+    assert first.fingerprint == second.fingerprint == fingerprint(first.data)
+
+
+def resolve_all(fixtures, targets):
+    """Resolves each target against a stand-in node; TargetNotFound is returned instead of raised."""
+    async def run():
+        node, client, _ = await stand_in_node(fixtures)
+        cache = ModuleCache(client)
+        results = []
+        try:
+            for target in targets:
+                try:
+                    results.append(await resolve_target(cache, client, target))
+                except TargetNotFound as e:
+                    results.append(e)
+            return results
+        finally:
+            await client.close()
+            await node.stop()
+
+    return asyncio.run(run())
+
+
+def test_resolve_target_picks_whichever_lookup_finds_something():
+    fixtures = ChainFixtures(framework_modules=1, accounts=1, modules_per_account=2, transactions=1)
+    tx_hash = fixtures.hashes[0]
+    long_address = "0x" + "ab" * 32
+    fixtures.modules[long_address] = fixtures.modules[fixtures.addresses[0]]
+
+    by_hash, by_address, short = resolve_all(fixtures, [tx_hash, long_address, fixtures.addresses[0]])
+    assert (by_hash.kind, by_hash.target) == ("transaction", tx_hash)
+    assert by_hash.data["hash"] == tx_hash
+    assert (by_address.kind, by_address.target, len(by_address.data)) == ("address", long_address, 2)
+    assert (short.kind, len(short.data)) == ("address", 2)
+
+
+def test_empty_account_is_only_a_fallback():
+    fixtures = ChainFixtures(framework_modules=1, accounts=1, transactions=1)
+    tx_hash = fixtures.hashes[0]
+    empty_account = "0x" + "cd" * 32
+    fixtures.modules[normalize_address(tx_hash)] = []  # the hash is also an account, one without modules
+    fixtures.modules[empty_account] = []
+
+    transaction, account = resolve_all(fixtures, [tx_hash, empty_account])
+    assert transaction.kind == "transaction"
+    assert (account.kind, account.target, account.data) == ("address", empty_account, [])
+
+
+def test_resolve_target_reports_targets_nothing_matches():
+    fixtures = ChainFixtures(framework_modules=1, accounts=0, transactions=0)
+    missing, not_hex = resolve_all(fixtures, ["0x" + "ef" * 32, "vault.apt"])
+    assert isinstance(missing, TargetNotFound)
+    assert isinstance(not_hex, TargetNotFound) and "neither" in str(not_hex)
+
+
+def test_simulation_round_trip_against_stand_in_node():
+    async def run():
+        fixtures = ChainFixtures(framework_modules=1, accounts=2, transactions=0)
+        node, client, _ = await stand_in_node(fixtures)
+        try:
+            sender = fixtures.addresses[0]
+            abi = fixtures.modules[sender][0]["abi"]
+            payload = build_payload(abi, "withdraw_0", ["0x1::aptos_coin::AptosCoin"], ["100"])
+            return await simulate(client, sender, payload)
+        finally:
+            await client.close()
+            await node.stop()
+
+    tx = asyncio.run(run())
+    assert tx["success"], tx["vm_status"]
+    assert tx["payload"]["arguments"] == ["0x6400000000000000"]
+    assert describe_changes(tx["changes"]) == [
+        "write_resource 0xa11ce000 0x1::coin::CoinStore<0x1::aptos_coin::AptosCoin>"
+    ]
@@ -0,0 +1,67 @@
+from context import CHARS_PER_TOKEN, build_chunks, chunk_modules, merge_verdicts, package_verdict, split_verdict
+
+
+def abi(name, functions=4, entry=False):
+    return {"address": "0xcafe", "name": name, "friends": [], "structs": [], "exposed_functions": [
+        {"name": f"{'withdraw' if entry else 'get'}_{i}", "visibility": "public", "is_entry": entry,
+         "is_view": not entry, "params": ["&signer", "u64"] if entry else ["address"], "return": []}
+        for i in range(functions)
+    ]}
+
+
+def test_chunks_fit_the_budget_riskiest_first():
+    abis = [abi(f"view_{i}") for i in range(6)] + [abi("vault", entry=True)]
+    chunks, omitted = build_chunks(abis, budget=60, max_chunks=10)
+    assert omitted == []
+    assert len(chunks) > 1
+    assert all(len(chunk) <= 60 * CHARS_PER_TOKEN for chunk in chunks)
+    assert chunk_modules(chunks[0])[0] == "vault"
+    assert sorted(name for chunk in chunks for name in chunk_modules(chunk)) == sorted(a["name"] for a in abis)
+
+
+def test_modules_past_max_chunks_are_omitted():
+    abis = [abi(f"mod_{i}", functions=20) for i in range(5)]
+    chunks, omitted = build_chunks(abis, budget=150, max_chunks=2)
+    assert len(chunks) == 2
+    kept = [name for chunk in chunks for name in chunk_modules(chunk)]
+    assert sorted(kept + [o.split("::")[1] for o in omitted]) == [a["name"] for a in abis]
+    assert omitted and all(o.startswith("0xcafe::") for o in omitted)
+
+
+def test_oversized_module_is_trimmed_to_the_budget():
+    chunks, omitted = build_chunks([abi("huge", functions=200)], budget=100)
+    assert omitted == []
+    assert len(chunks[0]) <= 100 * CHARS_PER_TOKEN
+    assert "lower-priority items omitted" in chunks[0]
+
+
+def test_riskiest_chunk_decides_the_merged_verdict():
+    merged = merge_verdicts([
+        {"status": "Safe", "risk_score": 10, "reason": "views only"},
+        {"status": "Risky", "risk_score": 70, "reason": "unchecked withdraw"},
+        {"status": "Safe", "risk_score": "bad", "reason": ""},
+    ])
+    assert merged == {"status": "Risky", "risk_score": 70, "reason": "unchecked withdraw"}
+    assert merge_verdicts([]) is None
+
+
+def test_split_verdict_falls_back_to_the_chunk_verdict():
+    chunk = {"status": "Safe", "risk_score": 20, "reason": "fine", "modules": [
+        {"name": "0xcafe::vault", "status": "Risky", "risk_score": 80, "reason": "drain"},
+    ]}
+    assert split_verdict(chunk, ["vault", "views"]) == {
+        "vault": {"status": "Risky", "risk_score": 80, "reason": "drain"},
+        "views": {"status": "Safe", "risk_score": 20, "reason": "fine"},
+    }
+
+
+def test_package_verdict_groups_modules_sharing_a_verdict():
+    verdict = package_verdict({
+        "a": {"status": "Safe", "risk_score": 10, "reason": "ok"},
+        "b": {"status": "Safe", "risk_score": 10, "reason": "ok"},
+        "vault": {"status": "Risky", "risk_score": 90, "reason": "drain"},
+    })
+    assert verdict == {"status": "Risky", "risk_score": 90, "reason": "vault: drain"}
+    safe = package_verdict({"a": {"status": "Safe", "risk_score": 10, "reason": "ok"},
+                            "b": {"status": "Safe", "risk_score": 10, "reason": "ok"}})
+    assert safe["reason"] == "a, b: ok"
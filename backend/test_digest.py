@@ -0,0 +1,120 @@
+import json
+
+from digest import digest_transaction
+
+ALICE, BOB, SPONSOR = "0xa11ce", "0xb0b", "0x5905"
+ALICE_STORE, BOB_STORE = "0xa5", "0xb5"
+
+
+def _store(address, owner, metadata="0xa", balance="0"):
+    return [
+        {"type": "write_resource", "address": address,
+         "data": {"type": "0x1::object::ObjectCore", "data": {"owner": owner, "allow_ungated_transfer": False}}},
+        {"type": "write_resource", "address": address,
+         "data": {"type": "0x1::fungible_asset::FungibleStore",
+                  "data": {"metadata": {"inner": metadata}, "balance": balance, "frozen": False}}},
+    ]
+
+
+def sponsored_transfer():
+    return {
+        "type": "user_transaction",
+        "version": "42",
+        "success": True,
+        "vm_status": "Executed successfully",
+        "sender": ALICE,
+        "gas_used": "12",
+        "gas_unit_price": "100",
+        "max_gas_amount": "2000",
+        "payload": {"type": "entry_function_payload", "function": "0x1::primary_fungible_store::transfer",
+                    "type_arguments": ["0x1::fungible_asset::Metadata"], "arguments": ["0xa", BOB, "500"]},
+        "signature": {"type": "fee_payer_signature", "fee_payer_address": SPONSOR, "secondary_signer_addresses": []},
+        "changes": _store(ALICE_STORE, ALICE) + _store(BOB_STORE, BOB) + [
+            {"type": "write_resource", "address": ALICE,
+             "data": {"type": "0x1::account::Account",
+                      "data": {"sequence_number": "3",
+                               "signer_capability_offer": {"for": {"vec": ["0xbad"]}},
+                               "rotation_capability_offer": {"for": {"vec": []}}}}},
+        ],
+        "events": [
+            {"type": "0x1::fungible_asset::Withdraw", "data": {"store": ALICE_STORE, "amount": "500"}},
+            {"type": "0x1::fungible_asset::Deposit", "data": {"store": BOB_STORE, "amount": "500"}},
+        ],
+    }
+
+
+def coin_transfer(tx_hash, sender, events):
+    """A plain coin::transfer with `events` legacy WithdrawEvents on the sender's CoinStore."""
+    return {
+        "type": "user_transaction",
+        "version": "7",
+        "hash": tx_hash,
+        "success": True,
+        "vm_status": "Executed successfully",
+        "sender": sender,
+        "sequence_number": "1",
+        "gas_used": "20",
+        "gas_unit_price": "100",
+        "max_gas_amount": "200000",
+        "payload": {"type": "entry_function_payload", "function": "0x1::coin::transfer",
+                    "type_arguments": ["0x1::aptos_coin::AptosCoin"], "arguments": [BOB, "1000"]},
+        "events": [
+            {"type": "0x1::coin::WithdrawEvent", "guid": {"account_address": sender, "creation_number": "3"},
+             "sequence_number": str(i), "data": {"amount": str(100 + i)}}
+            for i in range(events)
+        ],
+        "changes": [],
+        "signature": {"type": "ed25519_signature", "public_key": "0x" + "11" * 32, "signature": "0x" + "22" * 64},
+    }
+
+
+def test_signers_gas_and_balance_deltas():
+    digest = digest_transaction(sponsored_transfer())
+    assert digest["function"] == "0x1::primary_fungible_store::transfer"
+    assert digest["fee_payer"] == SPONSOR
+    assert digest["gas"] == {"used": 12, "unit_price": 100, "max_amount": 2000, "fee_octas": 1200, "paid_by": SPONSOR}
+    assert digest["balance_deltas"] == {
+        ALICE: {"0x1::aptos_coin::AptosCoin": -500},
+        BOB: {"0x1::aptos_coin::AptosCoin": 500},
+    }
+    # Bob's primary store is not a handed-out object, but Alice offering her signer is.
+    assert digest["sensitive"] == [f"signer capability offer of {ALICE} made to 0xbad"]
+
+
+def test_legacy_coin_events_use_the_coin_store_handles():
+    tx = coin_transfer("0x1", ALICE, events=3)
+    tx["changes"] = [{"type": "write_resource", "address": ALICE, "data": {
+        "type": "0x1::coin::CoinStore<0x1::aptos_coin::AptosCoin>",
+        "data": {"coin": {"value": "1"},
+                 "withdraw_events": {"guid": {"id": {"addr": ALICE, "creation_num": "3"}}},
+                 "deposit_events": {"guid": {"id": {"addr": ALICE, "creation_num": "2"}}}}}}]
+    digest = digest_transaction(tx)
+    spent = sum(int(e["data"]["amount"]) for e in tx["events"])
+    assert digest["balance_deltas"] == {ALICE: {"0x1::aptos_coin::AptosCoin": -spent}}
+    assert digest["events"] == {"0x1::coin::WithdrawEvent": 3}
+    assert digest["writes"] == {"write_resource 0x1::coin::CoinStore<0x1::aptos_coin::AptosCoin>": 1}
+
+
+def test_large_publish_is_summarized_not_truncated():
+    tx = coin_transfer("0x2", ALICE, events=500)
+    code = ["0x" + "ab" * 20000 for _ in range(40)]
+    tx["payload"] = {"type": "entry_function_payload", "function": "0x1::code::publish_package_txn",
+                     "type_arguments": [], "arguments": ["0x" + "cd" * 5000, code]}
+    tx["changes"] = [
+        {"type": "write_module", "address": ALICE, "data": {"bytecode": code[i], "abi": {"name": f"m{i}"}}}
+        for i in range(40)
+    ] + [
+        {"type": "write_resource", "address": ALICE, "data": {"type": "0x1::code::PackageRegistry", "data": {}}},
+        {"type": "write_resource", "address": ALICE,
+         "data": {"type": "0xa11ce::token::MintCapability<0xa11ce::token::T>", "data": {}}},
+    ]
+    digest = digest_transaction(tx)
+    text = json.dumps(digest)
+    assert len(text) < 5000 < len(str(tx))
+    assert digest["writes"]["write_module"] == 40
+    assert digest["arguments"][1][-1] == "... 32 more"
+    assert digest["sensitive"][0].startswith(f"code published at {ALICE}: m0, m1, m10")
+    assert digest["sensitive"][1:] == [
+        f"package registry updated at {ALICE}",
+        f"capability 0xa11ce::token::MintCapability<0xa11ce::token::T> stored at {ALICE}",
+    ]
@@ -0,0 +1,118 @@
+import json
+import asyncio
+
+from aptos_sdk.async_client import ApiError, RestClient
+
+from chain import normalize_address
+from indexer import ChainIndexer, Checkpoint, published_addresses
+from standins import Behaviour, ChainFixtures, HttpServer, Stats, fullnode_app
+
+
+def publish_transactions(fixtures):
+    return [tx for tx in fixtures.transactions.values() if tx["changes"]]
+
+
+def test_published_addresses_prefers_the_write_set():
+    fixtures = ChainFixtures(framework_modules=1, accounts=3, modules_per_account=2, transactions=10)
+    tx = publish_transactions(fixtures)[0]
+    assert published_addresses(tx) == [normalize_address(tx["sender"])]
+
+    # Published through a resource account: the write set names the address, not the sender.
+    resource = dict(tx, changes=[dict(c, address="0x00beef") for c in tx["changes"]])
+    assert published_addresses(resource) == ["0xbeef"]
+
+    # Without a write set (e.g. a trimmed response) the publish payload still counts.
+    assert published_addresses(dict(tx, changes=[])) == [normalize_address(tx["sender"])]
+    assert published_addresses(dict(tx, success=False)) == []
+    assert published_addresses(dict(tx, type="genesis_transaction")) == []
+    plain = next(t for t in fixtures.transactions.values() if not t["changes"])
+    assert published_addresses(plain) == []
+
+
+def test_waiting_address_is_queued_once_and_holds_back_the_checkpoint():
+    async def run():
+        indexer = ChainIndexer(client=None, audit=None, checkpoint_path="")
+        indexer.next_version = 120
+        await indexer.enqueue("0xcafe", 100)
+        await indexer.enqueue("0xcafe", 110)  # still waiting: the queued audit fetches the newest code
+        await indexer.enqueue("0xbeef", 105)
+        return indexer
+
+    indexer = asyncio.run(run())
+    assert indexer.queue.qsize() == 2
+    assert indexer.pending == {(100, "0xcafe"), (105, "0xbeef")}
+    assert indexer.processed_version() == 99
+
+
+def test_upgrades_jump_the_queue():
+    async def run():
+        indexer = ChainIndexer(client=None, audit=None, checkpoint_path="")
+        await indexer.enqueue("0xcafe", 100)
+        indexer.queue.get_nowait()
+        indexer.waiting.discard("0xcafe")  # picked up by a worker
+        await indexer.enqueue("0xbeef", 200)
+        await indexer.enqueue("0xcafe", 150)  # published before, so this is an upgrade
+        return [indexer.queue.get_nowait()[2] for _ in range(2)]
+
+    assert asyncio.run(run()) == ["0xcafe", "0xbeef"]
+
+
+def test_pruned_version_jumps_to_the_tip():
+    class PrunedNode:
+        async def transactions(self, limit=None, start=None):
+            if start is not None:
+                raise ApiError("version pruned", 410)
+            return [{"version": "5000"}]
+
+    async def run():
+        indexer = ChainIndexer(PrunedNode(), audit=None, checkpoint_path="")
+        indexer.next_version = 10
+        first = await indexer.fetch_page()
+        jumped_to = indexer.next_version
+        await indexer.fetch_page()
+        return first, jumped_to, indexer.next_version
+
+    assert asyncio.run(run()) == ([], None, 5001)
+
+
+def test_checkpoint_waits_for_pending_audits(tmp_path):
+    fixtures = ChainFixtures(framework_modules=1, accounts=3, modules_per_account=1, transactions=20)
+    versions = sorted(int(tx["version"]) for tx in fixtures.transactions.values())
+    first_publish = min(int(tx["version"]) for tx in publish_transactions(fixtures))
+    path = str(tmp_path / "checkpoint.json")
+    Checkpoint(path).save(versions[0] - 1)
+
+    async def wait_for(condition):
+        for _ in range(200):
+            if condition():
+                return
+            await asyncio.sleep(0.01)
+        raise AssertionError("timed out")
+
+    async def run():
+        node = HttpServer(fullnode_app(fixtures, Behaviour(), Stats()))
+        client = RestClient(f"{await node.start()}/v1")
+        release = asyncio.Event()
+        audited = []
+
+        async def audit(address):
+            await release.wait()
+            audited.append(address)
+
+        indexer = ChainIndexer(client, audit, checkpoint_path=path, workers=1, poll_seconds=0.01)
+        try:
+            indexer.start()
+            await wait_for(lambda: indexer.next_version == versions[-1] + 1)
+            held = json.load(open(path))["version"]
+            release.set()
+            await wait_for(lambda: not indexer.pending and indexer.saved_version == versions[-1])
+            return held, audited
+        finally:
+            await indexer.stop()
+            await client.close()
+            await node.stop()
+
+    held, audited = asyncio.run(run())
+    assert held == first_publish - 1
+    assert set(audited) == {normalize_address(tx["sender"]) for tx in publish_transactions(fixtures)}
+    assert json.load(open(path))["version"] == versions[-1]
@@ -0,0 +1,51 @@
+import time
+import asyncio
+
+import llm
+from llm import KeyPool, SharedQuota, TokenBucket
+
+
+def test_acquire_prefers_the_least_loaded_key_and_skips_cooling_ones():
+    async def run():
+        pool = KeyPool(["a", "b", "c"])
+        first = await pool.acquire(100)
+        second = await pool.acquire(100)
+        await pool.cool_down(pool.slots[2])
+        third = await pool.acquire(100)
+        return first.index, second.index, third.index
+
+    # c rests after its 429, so the third call doubles up on a key with quota instead.
+    assert asyncio.run(run()) == (0, 1, 0)
+
+
+def test_acquire_waits_for_quota_instead_of_failing():
+    async def run():
+        pool = KeyPool(["a"])
+        slot = pool.slots[0]
+        slot.requests = TokenBucket(600)  # refills one request every 0.1s
+        slot.requests.tokens = 0
+        started = time.monotonic()
+        await asyncio.wait_for(pool.acquire(100), 2)
+        return time.monotonic() - started
+
+    assert 0.05 < asyncio.run(run()) < 1
+
+
+def test_cool_down_is_seen_by_every_worker_sharing_the_quota(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm, "GEMINI_KEY_COOLDOWN_SECONDS", 0.2)
+    path = str(tmp_path / "quota.db")
+
+    async def run():
+        worker_a = KeyPool(["a", "b"], SharedQuota(path))
+        worker_b = KeyPool(["a", "b"], SharedQuota(path))
+        await worker_a.cool_down(worker_a.slots[0])
+        # Worker b never saw the 429 but still avoids key a, and waits once both keys rest.
+        moved = await worker_b.acquire(100)
+        await worker_a.cool_down(worker_a.slots[1])
+        started = time.monotonic()
+        back = await asyncio.wait_for(worker_b.acquire(100), 2)
+        return moved.index, back.index, time.monotonic() - started
+
+    moved, back, waited = asyncio.run(run())
+    assert moved == 1
+    assert back == 0 and waited > 0
@@ -0,0 +1,175 @@
+from prescreen import prescreen, screen_module
+
+# ABIs as the fullnode returns them for the modules in move/sources
+# (published at 0xcafe; #[test_only] functions are not part of the ABI).
+INSURANCE_VAULT_ABI = {
+    "address": "0xcafe",
+    "name": "insurance_vault",
+    "friends": [],
+    "exposed_functions": [
+        {"name": "claim_payout", "visibility": "private", "is_entry": True, "is_view": False,
+         "generic_type_params": [], "params": ["&signer"], "return": []},
+        {"name": "stake_for_insurance", "visibility": "public", "is_entry": True, "is_view": False,
+         "generic_type_params": [], "params": ["&signer", "u64"], "return": []},
+    ],
+    "structs": [
+        {"name": "InsurancePolicy", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "amount", "type": "u64"}, {"name": "timestamp", "type": "u64"}]},
+        {"name": "Vault", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "balance", "type": "0x1::coin::Coin<0x1::aptos_coin::AptosCoin>"}]},
+    ],
+}
+
+MESSAGE_BOARD_ABI = {
+    "address": "0xcafe",
+    "name": "message_board",
+    "friends": [],
+    "exposed_functions": [
+        {"name": "exist_message", "visibility": "public", "is_entry": False, "is_view": True,
+         "generic_type_params": [], "params": [], "return": ["bool"]},
+        {"name": "get_message_content", "visibility": "public", "is_entry": False, "is_view": True,
+         "generic_type_params": [], "params": [], "return": ["0x1::string::String"]},
+        {"name": "post_message", "visibility": "public", "is_entry": True, "is_view": False,
+         "generic_type_params": [], "params": ["&signer", "0x1::string::String"], "return": []},
+    ],
+    "structs": [
+        {"name": "BoardObjectController", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "extend_ref", "type": "0x1::object::ExtendRef"}]},
+        {"name": "Message", "is_native": False, "abilities": ["key"], "generic_type_params": [],
+         "fields": [{"name": "string_content", "type": "0x1::string::String"}]},
+    ],
+}
+
+
+def _rules(findings):
+    return {(f["item"], f["rule"]) for f in findings}
+
+
+def test_insurance_vault_payout_goes_to_model():
+    result = prescreen([INSURANCE_VAULT_ABI])
+    assert result["verdict"] is None
+    assert ("claim_payout", "signer-value-entry") in _rules(result["findings"])
+    assert not any(f["item"] == "stake_for_insurance" for f in result["findings"])
+
+
+def test_message_board_holds_extend_ref_but_is_not_conclusive():
+    result = prescreen([MESSAGE_BOARD_ABI])
+    assert result["score"] == 0
+    assert result["verdict"] is None  # post_message is a mutating entry point
+    assert _rules(result["findings"]) == {("BoardObjectController.extend_ref", "held-capability")}
+
+
+def test_view_only_module_is_safe_without_model():
+    abi = dict(MESSAGE_BOARD_ABI, exposed_functions=MESSAGE_BOARD_ABI["exposed_functions"][:2])
+    assert prescreen([abi])["verdict"] == "Safe"
+
+
+def test_public_capability_leak_is_risky_without_model():
+    abi = {
+        "address": "0xbad",
+        "name": "token",
+        "friends": ["0xbeef::router"],
+        "exposed_functions": [
+            {"name": "get_mint_cap", "visibility": "public", "is_entry": False, "is_view": False,
+             "params": [], "return": ["0x1::coin::MintCapability<0xbad::token::T>"]},
+            {"name": "emergency_withdraw", "visibility": "public", "is_entry": True, "is_view": False,
+             "params": ["address"], "return": []},
+            {"name": "route", "visibility": "friend", "is_entry": False, "is_view": False,
+             "params": [], "return": []},
+        ],
+        "structs": [
+            {"name": "Caps", "abilities": ["copy", "store", "key"],
+             "fields": [{"name": "mint_cap", "type": "0x1::coin::MintCapability<0xbad::token::T>"}]},
+        ],
+    }
+    result = prescreen([abi])
+    assert result["verdict"] == "Risky"
+    assert _rules(screen_module(abi)) == {
+        ("Caps.mint_cap", "copyable-capability"),
+        ("get_mint_cap", "capability-leak"),
+        ("emergency_withdraw", "unsigned-value-entry"),
+        ("friends", "external-friend"),
+    }
+
+
+def test_public_non_entry_payout_is_not_safe():
+    abi = {
+        "address": "0xbad",
+        "name": "vault",
+        "friends": [],
+        "exposed_functions": [
+            {"name": "take_all", "visibility": "public", "is_entry": False, "is_view": False,
+             "params": [], "return": ["0x1::coin::Coin<0x1::aptos_coin::AptosCoin>"]},
+            {"name": "borrow_signer", "visibility": "public", "is_entry": False, "is_view": False,
+             "params": [], "return": ["signer"]},
+        ],
+        "structs": [
+            {"name": "Vault", "abilities": ["key"],
+             "fields": [{"name": "coins", "type": "0x1::coin::Coin<0x1::aptos_coin::AptosCoin>"}]},
+        ],
+    }
+    result = prescreen([abi])
+    # Hints, not a verdict: a body may still check the caller, so the model decides.
+    assert result["verdict"] is None
+    assert _rules(result["findings"]) == {("take_all", "asset-leak"), ("borrow_signer", "signer-leak")}
+
+
+def test_public_function_keeps_package_from_safe_verdict():
+    abi = dict(MESSAGE_BOARD_ABI, exposed_functions=MESSAGE_BOARD_ABI["exposed_functions"][:2] + [
+        {"name": "bump", "visibility": "public", "is_entry": False, "is_view": False, "params": [], "return": []},
+    ])
+    result = prescreen([abi])
+    assert result["score"] == 0
+    assert result["verdict"] is None
+
+
+def _fn(name, params, returns, visibility="public", generics=0, entry=False):
+    return {"name": name, "visibility": visibility, "is_entry": entry, "is_view": False,
+            "generic_type_params": [{"constraints": []}] * generics, "params": params, "return": returns}
+
+
+# Trimmed to the functions that hand out coins, capabilities and signers, with the fullnode's types.
+COIN_ABI = {"address": "0x1", "name": "coin", "friends": ["0x1::aptos_coin", "0x1::genesis"], "exposed_functions": [
+    _fn("zero", [], ["0x1::coin::Coin<T0>"], generics=1),
+    _fn("mint", ["u64", "&0x1::coin::MintCapability<T0>"], ["0x1::coin::Coin<T0>"], generics=1),
+    _fn("extract", ["&mut 0x1::coin::Coin<T0>", "u64"], ["0x1::coin::Coin<T0>"], generics=1),
+    _fn("withdraw", ["&signer", "u64"], ["0x1::coin::Coin<T0>"], generics=1),
+    _fn("burn", ["0x1::coin::Coin<T0>", "&0x1::coin::BurnCapability<T0>"], [], generics=1),
+    _fn("initialize", ["&signer", "0x1::string::String", "0x1::string::String", "u8", "bool"],
+        ["0x1::coin::BurnCapability<T0>", "0x1::coin::FreezeCapability<T0>", "0x1::coin::MintCapability<T0>"], generics=1),
+    _fn("transfer", ["&signer", "address", "u64"], [], generics=1, entry=True),
+], "structs": [
+    {"name": "CoinStore", "abilities": ["key"], "generic_type_params": [{"constraints": []}],
+     "fields": [{"name": "coin", "type": "0x1::coin::Coin<T0>"}, {"name": "frozen", "type": "bool"}]},
+    {"name": "MintCapability", "abilities": ["copy", "store"], "generic_type_params": [{"constraints": []}],
+     "fields": [{"name": "dummy_field", "type": "bool"}]},
+]}
+
+OBJECT_ABI = {"address": "0x1", "name": "object", "friends": [], "exposed_functions": [
+    _fn("create_object", ["address"], ["0x1::object::ConstructorRef"]),
+    _fn("generate_signer", ["&0x1::object::ConstructorRef"], ["signer"]),
+    _fn("generate_extend_ref", ["&0x1::object::ConstructorRef"], ["0x1::object::ExtendRef"]),
+    _fn("generate_signer_for_extending", ["&0x1::object::ExtendRef"], ["signer"]),
+], "structs": [
+    {"name": "ExtendRef", "abilities": ["drop", "store"], "fields": [{"name": "self", "type": "address"}]},
+]}
+
+ACCOUNT_ABI = {"address": "0x1", "name": "account", "friends": ["0x1::genesis", "0x1::resource_account"],
+               "exposed_functions": [
+    _fn("create_signer_with_capability", ["&0x1::account::SignerCapability"], ["signer"]),
+    _fn("create_resource_account", ["&signer", "vector<u8>"], ["signer", "0x1::account::SignerCapability"]),
+    _fn("create_signer", ["address"], ["signer"], visibility="friend"),
+], "structs": [
+    {"name": "Account", "abilities": ["key", "store"], "fields": [
+        {"name": "signer_capability_offer", "type": "0x1::account::CapabilityOffer<0x1::account::SignerCapability>"},
+    ]},
+]}
+
+
+def test_framework_guards_by_capability_and_ref_are_not_leaks():
+    result = prescreen([COIN_ABI, OBJECT_ABI, ACCOUNT_ABI])
+    assert result["verdict"] is None
+    # zero(), mint(&MintCapability), generate_signer(&ConstructorRef), ... are guarded or hand out nothing.
+    leaks = {item for item, rule in _rules(result["findings"]) if rule.endswith("-leak")}
+    assert leaks == {"create_signer"}
+    assert all(f["severity"] in ("info", "low") for f in result["findings"])
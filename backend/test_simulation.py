@@ -0,0 +1,59 @@
+import pytest
+from aptos_sdk.bcs import Serializer
+
+from simulation import SimulationError, build_payload
+
+INSURANCE_VAULT_ABI = {"address": "0xcafe", "name": "insurance_vault", "exposed_functions": [
+    {"name": "claim_payout", "visibility": "private", "is_entry": True, "is_view": False,
+     "generic_type_params": [], "params": ["&signer"], "return": []},
+    {"name": "stake_for_insurance", "visibility": "public", "is_entry": True, "is_view": False,
+     "generic_type_params": [], "params": ["&signer", "u64"], "return": []},
+]}
+
+MESSAGE_BOARD_ABI = {"address": "0xcafe", "name": "message_board", "exposed_functions": [
+    {"name": "exist_message", "visibility": "public", "is_entry": False, "is_view": True,
+     "generic_type_params": [], "params": [], "return": ["bool"]},
+    {"name": "post_message", "visibility": "public", "is_entry": True, "is_view": False,
+     "generic_type_params": [], "params": ["&signer", "0x1::string::String"], "return": []},
+]}
+
+
+def _encoded_args(payload):
+    return [arg.hex() for arg in payload.value.args]
+
+
+def test_payload_encodes_args_from_abi_types():
+    payload = build_payload(INSURANCE_VAULT_ABI, "stake_for_insurance", [], ["1000"])
+    assert _encoded_args(payload) == ["e803000000000000"]
+    payload = build_payload(MESSAGE_BOARD_ABI, "post_message", [], ["gm"])
+    assert _encoded_args(payload) == ["02676d"]
+
+
+@pytest.mark.parametrize("function, type_args, args, message", [
+    ("stake_for_insurance", [], [], "takes 1 arguments"),
+    ("stake_for_insurance", ["0x1::aptos_coin::AptosCoin"], ["1"], "takes 0 type arguments"),
+    ("stake_for_insurance", [], ["ten"], "is not a u64"),
+    ("stake_for_insurance", [], [str(2 ** 64)], "out of range"),
+    ("unstake", [], [], "has no function"),
+])
+def test_bad_requests_fail_before_any_network_call(function, type_args, args, message):
+    with pytest.raises(SimulationError, match=message):
+        build_payload(INSURANCE_VAULT_ABI, function, type_args, args)
+
+
+def test_view_functions_cannot_be_simulated():
+    with pytest.raises(SimulationError, match="not an entry function"):
+        build_payload(MESSAGE_BOARD_ABI, "exist_message", [], [])
+
+
+def test_vector_and_option_args():
+    abi = {"address": "0xcafe", "name": "m", "exposed_functions": [
+        {"name": "f", "is_entry": True, "generic_type_params": [],
+         "params": ["&signer", "vector<u8>", "vector<address>", "0x1::option::Option<u64>"]},
+    ]}
+    payload = build_payload(abi, "f", [], ["0x0102", '["0x1"]', ""])
+    expected = Serializer()
+    expected.sequence([1, 2], Serializer.u8)
+    assert _encoded_args(payload)[0] == expected.output().hex()
+    assert _encoded_args(payload)[1] == "01" + "00" * 31 + "01"
+    assert _encoded_args(payload)[2] == "00"